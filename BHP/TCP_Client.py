@@ -1,22 +1,328 @@
+import argparse
+import asyncio
+import json
 import socket
+import sys
+import time
+
+import mux
+from metrics import Histogram
 
 target_host = "0.0.0.0"
 target_port = 9998
 
-# Create a socket object
-client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+request = b"GET / HTTP/1.1\r\nHost: 0.0.0.0\r\n\r\n"
+
+
+class MuxConnection:
+    """A keep-alive connection that carries many requests at once.
+
+    Each request gets the next id and a future; a background task reads
+    the replies and resolves the future with the matching id, whatever
+    order they come back in.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.pending = {}  # Request id -> future of the reply.
+        self.closed = False
+        self.receiver = asyncio.create_task(self.receive())
+
+    @classmethod
+    async def open(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def receive(self):
+        try:
+            while True:
+                request_id, payload = await mux.read_message(self.reader)
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(payload)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            # The connection is gone; fail whatever was still waiting on it.
+            self.closed = True
+            self.writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('connection closed'))
+            self.pending.clear()
+
+    async def request(self, payload):
+        if self.closed:
+            raise ConnectionError('connection closed')
+        request_id = self.next_id
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(mux.pack(request_id, payload))
+            await self.writer.drain()
+        except BaseException:
+            self.pending.pop(request_id, None)
+            if future.done():
+                future.exception()  # Failed by receive() already; don't warn about it.
+            else:
+                future.cancel()
+            raise
+        try:
+            return await future
+        finally:
+            self.pending.pop(request_id, None)  # Still there if we timed out.
+
+    def close(self):
+        self.receiver.cancel()
+
+
+class ConnectionPool:
+    """Share a fixed number of MuxConnections between any number of callers.
+
+    Each request goes to the connection with the fewest requests in
+    flight. Connections are opened on first use, and one that broke is
+    reopened by the next request that picks it.
+    """
+
+    def __init__(self, host, port, size):
+        self.host = host
+        self.port = port
+        self.slots = [None] * size  # Tasks opening (or done opening) each connection.
+
+    def load(self, i):
+        slot = self.slots[i]
+        if slot is None or not slot.done() or slot.exception():
+            return 0
+        return len(slot.result().pending)
+
+    async def request(self, payload):
+        i = min(range(len(self.slots)), key=self.load)
+        slot = self.slots[i]
+        if slot is None or (slot.done() and (slot.exception() or slot.result().closed)):
+            slot = self.slots[i] = asyncio.ensure_future(MuxConnection.open(self.host, self.port))
+        connection = await slot
+        return await connection.request(payload)
+
+    def close(self):
+        for slot in self.slots:
+            if slot is not None and slot.done() and not slot.exception():
+                slot.result().close()
+
+
+class LoadGenerator:
+    """Send requests over many concurrent connections and time the replies.
+
+    Every connection runs as its own asyncio task, taking the next request
+    number until there are none left. With a target rate, request k is due
+    at start + k / rate and its latency is counted from then rather than
+    from when it was actually sent, so a server that falls behind shows up
+    in the latencies instead of just slowing the senders down.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.histogram = Histogram()
+        self.next_request = 0
+        self.errors = 0
+        self.start = 0
+
+    def take(self):
+        """Return the next request number and when it is due, or None."""
+        if self.next_request >= self.args.requests:
+            return None
+        k = self.next_request
+        self.next_request += 1
+        if self.args.rate:
+            return k, self.start + k / self.args.rate
+        return k, None
+
+    async def exchange(self, reader, writer):
+        writer.write(self.args.payload)
+        await writer.drain()
+        if self.args.until:
+            await reader.readuntil(self.args.until)
+        elif self.args.keep_alive:
+            if not await reader.read(4096):
+                raise ConnectionError('connection closed before a reply')
+        else:
+            # The server closes after its reply.
+            while await reader.read(65536):
+                pass
+
+    async def connection(self):
+        reader = writer = None
+
+        async def attempt():
+            nonlocal reader, writer
+            if writer is None:
+                reader, writer = await asyncio.open_connection(self.args.target, self.args.port)
+                if self.args.greeting:
+                    await reader.readuntil(self.args.until)
+            await self.exchange(reader, writer)
+
+        try:
+            while (job := self.take()) is not None:
+                k, due = job
+                if due is not None:
+                    await asyncio.sleep(due - time.perf_counter())
+                sent = time.perf_counter()
+                try:
+                    await asyncio.wait_for(attempt(), self.args.timeout or None)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                    self.errors += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                    continue
+                finally:
+                    if writer is not None and not self.args.keep_alive:
+                        writer.close()
+                        reader = writer = None
+                done = time.perf_counter()
+                self.histogram.record((done - (due if due is not None else sent)) * 1e6)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def multiplexed(self, pool):
+        while (job := self.take()) is not None:
+            k, due = job
+            if due is not None:
+                await asyncio.sleep(due - time.perf_counter())
+            sent = time.perf_counter()
+            try:
+                await asyncio.wait_for(pool.request(self.args.payload), self.args.timeout or None)
+            except (OSError, asyncio.TimeoutError):
+                self.errors += 1
+                continue
+            done = time.perf_counter()
+            self.histogram.record((done - (due if due is not None else sent)) * 1e6)
+
+    async def run(self):
+        self.start = time.perf_counter()
+        if self.args.mux:
+            pool = ConnectionPool(self.args.target, self.args.port, self.args.connections)
+            try:
+                await asyncio.gather(*(self.multiplexed(pool)
+                                       for _ in range(self.args.connections * self.args.pipeline)))
+            finally:
+                pool.close()
+        else:
+            await asyncio.gather(*(self.connection() for _ in range(self.args.connections)))
+        seconds = time.perf_counter() - self.start
+        return {
+            'target': f'{self.args.target}:{self.args.port}',
+            'connections': self.args.connections,
+            'keep_alive': self.args.keep_alive,
+            'mux': self.args.mux,
+            'pipeline': self.args.pipeline if self.args.mux else None,
+            'rate': self.args.rate,
+            'timeout': self.args.timeout,
+            'requests': self.histogram.total,
+            'errors': self.errors,
+            'seconds': round(seconds, 3),
+            'requests_per_second': round(self.histogram.total / seconds, 1),
+            'latency_us': self.histogram.summary(),
+        }
+
+
+def send_one(host, port, payload):
+    # Create a socket object
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    # Connect to the target host and port
+    client.connect((host, port))
+
+    # Send some data
+    client.send(payload)
+
+    # Receive some data
+    response = client.recv(4096)
+
+    # Print the response
+    print(response.decode())
+
+    # Close the connection
+    client.close()
+
+
+async def send_one_mux(host, port, payload, timeout):
+    connection = await MuxConnection.open(host, port)
+    try:
+        print((await asyncio.wait_for(connection.request(payload), timeout)).decode())
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='BHP TCP Client',
+        epilog='With -n or -c, load-test a local tcp_server.py or netcat.py -l instead of '
+               'sending one request, e.g. TCP_Client.py -c 100 -n 50000 --rate 5000 --json out.json, '
+               'or against tcp_server.py --protocol mux: TCP_Client.py --mux -c 4 --pipeline 32 -n 100000')
+    parser.add_argument('-t', '--target', default=target_host, help='host to connect to')
+    parser.add_argument('-p', '--port', type=int, default=target_port, help='port to connect to')
+    parser.add_argument('-d', '--data', help='request to send instead of an HTTP GET')
+    parser.add_argument('-c', '--connections', type=int, help='concurrent connections')
+    parser.add_argument('-n', '--requests', type=int, help='requests to send in all')
+    parser.add_argument('-r', '--rate', type=float, help='target requests per second in all (default: as fast as possible)')
+    parser.add_argument('-k', '--keep-alive', action='store_true',
+                        help='send every request of a connection over one socket instead of reconnecting')
+    parser.add_argument('-u', '--until', help='with --keep-alive, the bytes that end a reply (e.g. a prompt)')
+    parser.add_argument('-g', '--greeting', action='store_true',
+                        help='with --until, read one reply right after connecting, for servers like '
+                             'netcat.py -c that send a prompt first')
+    parser.add_argument('-m', '--mux', action='store_true',
+                        help='use the keep-alive multiplexed protocol of tcp_server.py --protocol mux, '
+                             'with a pool of --connections connections')
+    parser.add_argument('--pipeline', type=int, default=1,
+                        help='with --mux, requests in flight on each connection at once')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='seconds to wait for each reply before counting it as an error (0 for no limit)')
+    parser.add_argument('--json', help='write the results as JSON to this file, or - for stdout')
+    args = parser.parse_args()
+    args.payload = args.data.encode() if args.data is not None else request
+    if args.until is not None:
+        args.until = args.until.encode()
+        args.keep_alive = True
+
+    if args.greeting and args.until is None:
+        parser.error('--greeting needs --until')
+    if args.mux and args.until is not None:
+        parser.error('--mux replies are length-prefixed; --until does not apply')
+    if args.mux:
+        args.keep_alive = True
+    if args.timeout < 0:
+        parser.error('--timeout must not be negative')
 
-# Connect to the target host and port
-client.connect((target_host, target_port))
+    if args.connections is None and args.requests is None:
+        if args.mux:
+            asyncio.run(send_one_mux(args.target, args.port, args.payload, args.timeout or None))
+        else:
+            send_one(args.target, args.port, args.payload)
+        return
 
-# Send some data
-client.send(b"GET / HTTP/1.1\r\nHost: 0.0.0.0\r\n\r\n")
+    args.connections = args.connections or 1
+    args.requests = args.requests or 1000
+    if (args.connections < 1 or args.requests < 1 or args.pipeline < 1
+            or (args.rate is not None and args.rate <= 0)):
+        parser.error('--connections, --requests, --pipeline and --rate must be positive')
 
-# Receive some data
-response = client.recv(4096)
+    results = asyncio.run(LoadGenerator(args).run())
+    latency = results['latency_us']
+    print(f'[*] {results["requests"]} requests, {results["errors"]} errors in {results["seconds"]}s: '
+          f'{results["requests_per_second"]} req/s', file=sys.stderr)
+    print(f'[*] latency (us) p50={latency["p50"]} p95={latency["p95"]} p99={latency["p99"]} '
+          f'p999={latency["p999"]} max={latency["max"]}', file=sys.stderr)
+    if args.json == '-':
+        print(json.dumps(results, indent=2))
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
 
-# Print the response
-print(response.decode())
 
-# Close the connection
-client.close()
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import struct
+
+# Every message on a multiplexed connection is this header followed by
+# length bytes of payload. A reply carries the id of the request it
+# answers, so one keep-alive connection can have many requests in flight.
+HEADER = struct.Struct('!II')  # request id, payload length
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+
+def pack(request_id, payload):
+    return HEADER.pack(request_id, len(payload)) + payload
+
+
+def unpack_all(buffer):
+    """Remove the complete messages from the front of the bytearray buffer.
+
+    Return them as a list of (request id, payload). A partial message at
+    the end stays in buffer until the rest of it arrives.
+    """
+    messages = []
+    start = 0
+    while len(buffer) - start >= HEADER.size:
+        request_id, length = HEADER.unpack_from(buffer, start)
+        if length > MAX_PAYLOAD:
+            raise ValueError(f'message of {length} bytes is over the {MAX_PAYLOAD} byte limit')
+        end = start + HEADER.size + length
+        if end > len(buffer):
+            break
+        messages.append((request_id, bytes(buffer[start + HEADER.size:end])))
+        start = end
+    del buffer[:start]
+    return messages
+
+
+async def read_message(reader):
+    """Read one message from an asyncio StreamReader."""
+    request_id, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_PAYLOAD:
+        raise ValueError(f'message of {length} bytes is over the {MAX_PAYLOAD} byte limit')
+    return request_id, await reader.readexactly(length)
\ No newline at end of file
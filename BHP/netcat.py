@@ -1,10 +1,19 @@
 import argparse
+import asyncio
+import codecs
+import os
+import select
 import socket
 import shlex
+import stat
+import struct
 import subprocess
 import sys
 import textwrap
 import threading
+import time
+
+import metrics
 
 
 def execute(cmd):
@@ -22,10 +31,256 @@ def execute(cmd):
         return f'Command failed:\n{e.output.decode()}'
 
 
+async def execute_async(cmd):
+    cmd = cmd.strip()
+    if not cmd:
+        return ''
+
+    process = await asyncio.create_subprocess_exec(
+        *shlex.split(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+    output, _ = await process.communicate()
+    if process.returncode:
+        return f'Command failed:\n{output.decode()}'
+    return output.decode()
+
+
+def execute_stream(cmd, send, buffer_size=65536, timeout=None):
+    """Run cmd and pass its output to send() in chunks as it is produced.
+
+    At most one pipe's worth of output plus buffer_size is held at a
+    time: while send() blocks on a slow client the command blocks on its
+    full pipe. The command is killed if it runs longer than timeout
+    seconds.
+    """
+    cmd = cmd.strip()
+    if not cmd:
+        return
+
+    process = subprocess.Popen(
+        shlex.split(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=0
+    )
+    deadline = time.monotonic() + timeout if timeout else None
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    try:
+        while True:
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    process.kill()
+                    send(f'Command timed out after {timeout}s\n'.encode())
+                    return
+            if not select.select([process.stdout], [], [], wait)[0]:
+                continue  # Nothing yet; check the deadline again.
+            n = process.stdout.readinto(buffer)
+            if not n:
+                break
+            send(view[:n])
+        # The output is done, but the command may not have exited yet.
+        wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            process.wait(wait)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            send(f'Command timed out after {timeout}s\n'.encode())
+            return
+    finally:
+        if process.returncode is None:
+            process.kill()  # Timed out, or send() failed.
+        process.stdout.close()
+        process.wait()
+    if process.returncode:
+        send(f'Command failed with exit code {process.returncode}\n'.encode())
+
+
+async def execute_stream_async(cmd, write, drain, buffer_size=65536, timeout=None):
+    """Like execute_stream(), for an asyncio stream's write() and drain()."""
+    cmd = cmd.strip()
+    if not cmd:
+        return
+
+    process = await asyncio.create_subprocess_exec(
+        *shlex.split(cmd),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT
+    )
+
+    async def pump():
+        while True:
+            data = await process.stdout.read(buffer_size)
+            if not data:
+                break
+            write(data)
+            await drain()  # Stop reading while the client catches up.
+        await process.wait()
+
+    try:
+        await asyncio.wait_for(pump(), timeout)
+    except asyncio.TimeoutError:
+        write(f'Command timed out after {timeout}s\n'.encode())
+        return
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode:
+        write(f'Command failed with exit code {process.returncode}\n'.encode())
+
+
+def transfer_summary(nbytes, seconds):
+    rate = nbytes / seconds if seconds else 0
+    return f'{nbytes} bytes in {seconds:.2f}s ({rate / 1048576:.2f} MiB/s)'
+
+
+def close_gracefully(sock, linger=1):
+    """Close a client socket so the client sees the end of the reply.
+
+    Closing with a request still unread makes the kernel reset the
+    connection, which can throw away the reply, so send our FIN first
+    and read until the client closes too (or linger seconds pass).
+    """
+    try:
+        sock.shutdown(socket.SHUT_WR)
+        sock.settimeout(linger)
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass  # Already gone, or too slow to close; reset it.
+    finally:
+        sock.close()
+
+
+def write_chunk(f, data, sync):
+    f.write(data)
+    if sync:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+LENGTH_PREFIX = struct.Struct('!I')
+
+
+def frame(data, framing):
+    """Wrap a reply so the client can tell where it ends.
+
+    Only length framing changes the bytes sent; with delimiter framing
+    the client splits on a marker the replies already contain, such as
+    the command shell's prompt.
+    """
+    if framing == 'length':
+        return LENGTH_PREFIX.pack(len(data)) + data
+    return data
+
+
+class FramedReader:
+    """Read messages from a socket through one reusable buffer.
+
+    Data is received into a bytearray between the read offset start and
+    the write offset end. Consumed bytes are only moved when the free space
+    at the end runs out, and the buffer doubles when a message is bigger
+    than it, so a message of any size is assembled in linear time. Bytes
+    are decoded incrementally, so a UTF-8 character split between two
+    reads is decoded whole.
+
+    framing picks how messages end:
+        length    - each message has a 4-byte big-endian length prefix
+        delimiter - each message ends with delimiter, which is kept
+        none      - a message is whatever has arrived when the socket
+                    goes quiet; a best guess, as TCP keeps no boundaries
+    """
+
+    def __init__(self, sock, framing='none', delimiter=b'BHP: #> ', buffer_size=65536):
+        self.sock = sock
+        self.framing = framing
+        self.delimiter = delimiter
+        self.buffer = bytearray(buffer_size)
+        self.start = 0
+        self.end = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def fill(self):
+        """Receive more data. Return False if the peer closed the connection."""
+        if self.end == len(self.buffer):
+            if self.start:
+                # Slide the unread bytes back to the front.
+                self.buffer[:self.end - self.start] = self.buffer[self.start:self.end]
+                self.end -= self.start
+                self.start = 0
+            else:
+                self.buffer.extend(bytes(len(self.buffer)))
+        n = self.sock.recv_into(memoryview(self.buffer)[self.end:])
+        self.end += n
+        return n > 0
+
+    def take(self, n):
+        data = bytes(self.buffer[self.start:self.start + n])
+        self.start += n
+        if self.start == self.end:
+            self.start = self.end = 0
+        return data
+
+    def read_exact(self, n):
+        while self.end - self.start < n:
+            if not self.fill():
+                return None
+        return self.take(n)
+
+    def read_until(self, delimiter):
+        # How far past start has been searched. It is relative to start
+        # because fill() may slide the unread bytes to the front.
+        searched = 0
+        while True:
+            i = self.buffer.find(delimiter, self.start + searched, self.end)
+            if i != -1:
+                return self.take(i + len(delimiter) - self.start)
+            # Only rescan the tail that could hold the start of a delimiter.
+            searched = max(0, self.end - self.start - len(delimiter) + 1)
+            if not self.fill():
+                return None
+
+    def read_available(self):
+        if self.start == self.end and not self.fill():
+            return None
+        while select.select([self.sock], [], [], 0.05)[0]:
+            if not self.fill():
+                break
+        return self.take(self.end - self.start)
+
+    def read_message(self):
+        """Return the next message as text, or None at end of stream.
+
+        At end of stream any bytes left over come back as a last message,
+        even if they never got their delimiter or all of their length.
+        """
+        if self.framing == 'length':
+            header = self.read_exact(LENGTH_PREFIX.size)
+            if header is None:
+                return None
+            data = self.read_exact(LENGTH_PREFIX.unpack(header)[0])
+        elif self.framing == 'delimiter':
+            data = self.read_until(self.delimiter)
+        else:
+            data = self.read_available()
+        if data is None:
+            # The peer closed. Whatever arrived without its frame is
+            # still part of the reply, such as an upload's last line.
+            data = self.take(self.end - self.start)
+            return self.decoder.decode(data, final=True) or None
+        return self.decoder.decode(data)
+
+
 class NetCat:
     def __init__(self, args, buffer=None):
         self.args = args
         self.buffer = buffer
+        self.metrics = metrics.Metrics()
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
@@ -40,35 +295,79 @@ class NetCat:
             return True   # Port is in use
 
     def run(self):
-        if self.args.listen:
+        if self.args.listen and self.args.event_loop:
+            self.listen_async()
+        elif self.args.listen:
             self.listen()
+        elif self.args.file:
+            self.send_file()
         else:
             self.send()
 
     def send(self):
         self.socket.connect((self.args.target, self.args.port))
         if self.buffer:
-            self.socket.send(self.buffer)
+            self.socket.sendall(self.buffer)
 
+        reader = self.reader()
         try:
             while True:
-                recv_len = 1
-                response = ''
-                while recv_len:
-                    data = self.socket.recv(4096)
-                    recv_len = len(data)
-                    response += data.decode()
-                    if recv_len < 4096:
-                        break
+                response = reader.read_message()
+                if response is None:
+                    break  # The other side closed the connection.
                 if response:
                     print(response, end='')
                     buffer = input('> ')
                     buffer += '\n'
-                    self.socket.send(buffer.encode())
+                    self.socket.sendall(buffer.encode())
         except KeyboardInterrupt:
             print('\n[!] User terminated.')
             self.socket.close()
             sys.exit()
+        self.socket.close()
+
+    def reader(self):
+        # Allow escapes such as \n in the delimiter on the command line.
+        delimiter = codecs.decode(self.args.delimiter, 'unicode_escape').encode()
+        return FramedReader(self.socket, self.args.framing, delimiter, self.args.buffer_size)
+
+    def reply(self, data):
+        return frame(data, self.args.framing)
+
+    def send_file(self):
+        self.socket.connect((self.args.target, self.args.port))
+        start = time.perf_counter()
+        if self.args.file == '-':
+            sent = self.send_chunks(sys.stdin.buffer)
+        else:
+            with open(self.args.file, 'rb') as f:
+                if stat.S_ISREG(os.fstat(f.fileno()).st_mode) and not self.args.chunked:
+                    # Let the kernel copy the file to the socket (zero-copy).
+                    sent = self.socket.sendfile(f)
+                else:
+                    sent = self.send_chunks(f)
+        # Half-close so the listener sees the end of the file.
+        self.socket.shutdown(socket.SHUT_WR)
+        print(f'[*] Sent {transfer_summary(sent, time.perf_counter() - start)}')
+
+        reader = self.reader()
+        while True:
+            response = reader.read_message()
+            if response is None:
+                break
+            print(response, end='')
+        self.socket.close()
+
+    def send_chunks(self, f):
+        buffer = bytearray(self.args.buffer_size)
+        view = memoryview(buffer)
+        sent = 0
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                return sent
+            self.socket.sendall(view[:n])
+            sent += n
 
     def listen(self):
         if self.is_port_in_use():
@@ -78,44 +377,176 @@ class NetCat:
         self.socket.bind((self.args.target, self.args.port))
         self.socket.listen(5)
         print(f"[*] Listening on {self.args.target}:{self.args.port}")
+        self.metrics.expose(self.args.stats_interval, self.args.stats_port)
 
         while True:
             client_socket, _ = self.socket.accept()
             client_thread = threading.Thread(target=self.handle, args=(client_socket,))
             client_thread.start()
 
-    def handle(self, client_socket):
+    def listen_async(self):
+        if self.is_port_in_use():
+            print(f"[!] Port {self.args.port} is already in use on {self.args.target}.")
+            sys.exit(1)
+
+        self.socket.bind((self.args.target, self.args.port))
+        self.socket.setblocking(False)
+        print(f"[*] Listening on {self.args.target}:{self.args.port} "
+              f"(event loop, up to {self.args.max_connections} connections)")
+        self.metrics.expose(self.args.stats_interval, self.args.stats_port)
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print('\n[!] User terminated.')
+
+    async def serve(self):
+        self.active = 0
+        # limit caps how much each connection buffers before the loop
+        # stops reading from it, which pushes back on fast senders.
+        server = await asyncio.start_server(
+            self.handle_async, sock=self.socket, limit=self.args.buffer_size,
+            backlog=min(self.args.max_connections, socket.SOMAXCONN))
+        async with server:
+            await server.serve_forever()
+
+    async def handle_async(self, reader, writer):
+        if self.active >= self.args.max_connections:
+            self.metrics.counters().rejected += 1
+            writer.close()  # Over the limit; turn the connection away.
+            return
+        self.active += 1
+        timeout = self.args.idle_timeout or None
+        try:
+            with self.metrics.connection(self.handler_name()) as stats:
+                await self.serve_async(reader, writer, stats, timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass  # Idle too long or the client went away.
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def serve_async(self, reader, writer, stats, timeout):
+        def write(data):
+            writer.write(data)
+            stats.bytes_out += len(data)
+
+        if self.args.execute and self.args.stream:
+            await execute_stream_async(self.args.execute, write, writer.drain, self.args.buffer_size,
+                                       self.args.timeout)
+            await asyncio.wait_for(writer.drain(), timeout)
+
+        elif self.args.execute:
+            output = await execute_async(self.args.execute)
+            write(self.reply(output.encode()))
+            await asyncio.wait_for(writer.drain(), timeout)
+
+        elif self.args.upload:
+            received = 0
+            start = time.perf_counter()
+            sync = self.args.fsync == 'always'
+            try:
+                # The disk writes and fsyncs run in worker threads so a
+                # slow disk doesn't stall every other connection.
+                f = await asyncio.to_thread(open, self.args.upload, 'wb')
+                try:
+                    while True:
+                        data = await asyncio.wait_for(reader.read(self.args.buffer_size), timeout)
+                        if not data:
+                            break
+                        await asyncio.to_thread(write_chunk, f, data, sync)
+                        received += len(data)
+                        stats.bytes_in += len(data)
+                    if self.args.fsync == 'end':
+                        await asyncio.to_thread(write_chunk, f, b'', True)
+                finally:
+                    await asyncio.to_thread(f.close)
+                summary = transfer_summary(received, time.perf_counter() - start)
+                print(f'[*] Received {summary}')
+                data = self.reply(f'Saved file to {self.args.upload}\n'.encode())
+            except (asyncio.TimeoutError, ConnectionError):
+                raise  # Both are OSErrors too, but not the file's fault.
+            except OSError as e:
+                stats.error(e)
+                data = self.reply(f'Failed to save file: {e}\n'.encode())
+            write(data)
+            await asyncio.wait_for(writer.drain(), timeout)
+
+    def handler_name(self):
         if self.args.execute:
+            return 'execute'
+        if self.args.upload:
+            return 'upload'
+        return 'command'
+
+    def handle(self, client_socket):
+        try:
+            with self.metrics.connection(self.handler_name()) as stats:
+                self.serve_client(client_socket, stats)
+        finally:
+            close_gracefully(client_socket)
+
+    def serve_client(self, client_socket, stats):
+        def send(data):
+            client_socket.sendall(data)
+            stats.bytes_out += len(data)
+
+        if self.args.execute and self.args.stream:
+            execute_stream(self.args.execute, send, self.args.buffer_size, self.args.timeout)
+
+        elif self.args.execute:
             output = execute(self.args.execute)
-            client_socket.send(output.encode())
+            send(self.reply(output.encode()))
 
         elif self.args.upload:
-            file_buffer = b''
-            while True:
-                data = client_socket.recv(4096)
-                if data:
-                    file_buffer += data
-                else:
-                    break
+            # Stream the upload straight to disk through one reusable
+            # buffer, so memory use stays flat however big the file is.
+            buffer = bytearray(self.args.buffer_size)
+            view = memoryview(buffer)
+            received = 0
+            start = time.perf_counter()
             try:
                 with open(self.args.upload, 'wb') as f:
-                    f.write(file_buffer)
-                client_socket.send(f'Saved file to {self.args.upload}\n'.encode())
+                    while True:
+                        n = client_socket.recv_into(buffer)
+                        if not n:
+                            break
+                        f.write(view[:n])
+                        received += n
+                        stats.bytes_in += n
+                        if self.args.fsync == 'always':
+                            f.flush()
+                            os.fsync(f.fileno())
+                    if self.args.fsync == 'end':
+                        f.flush()
+                        os.fsync(f.fileno())
+                summary = transfer_summary(received, time.perf_counter() - start)
+                print(f'[*] Received {summary}')
+                send(self.reply(f'Saved file to {self.args.upload}\n'.encode()))
             except Exception as e:
-                client_socket.send(f'Failed to save file: {e}\n'.encode())
+                stats.error(e)
+                send(self.reply(f'Failed to save file: {e}\n'.encode()))
+            client_socket.close()
 
         elif self.args.command:
             cmd_buffer = b''
+            prompt = b'BHP: #> '
+            send(self.reply(prompt))
             while True:
                 try:
-                    client_socket.send(b'BHP: #> ')
                     while b'\n' not in cmd_buffer:
-                        cmd_buffer += client_socket.recv(64)
-                    response = execute(cmd_buffer.decode())
-                    if response:
-                        client_socket.send(response.encode())
+                        data = client_socket.recv(64)
+                        stats.bytes_in += len(data)
+                        cmd_buffer += data
+                    if self.args.stream:
+                        execute_stream(cmd_buffer.decode(), send, self.args.buffer_size, self.args.timeout)
+                        send(prompt)
+                    else:
+                        response = execute(cmd_buffer.decode())
+                        # Send the output and the next prompt as one message.
+                        send(self.reply(response.encode() + prompt))
                     cmd_buffer = b''
                 except Exception as e:
+                    stats.error(e)
                     print(f'[!] Server error: {e}')
                     self.socket.close()
                     sys.exit()
@@ -129,21 +560,47 @@ if __name__ == '__main__':
             netcat.py -t 192.168.1.108 -p 5555 -l -c           # command shell
             netcat.py -t 192.168.1.108 -p 5555 -l -u=mytest.txt # receive uploaded file
             netcat.py -t 192.168.1.108 -p 5555 -l -e="cat /etc/passwd" # run a command
+            netcat.py -t 192.168.1.108 -p 5555 -l -e="uptime" --event-loop # same, for many clients
+            netcat.py -t 192.168.1.108 -p 5555 -l -e="ping -c 30 10.0.0.1" --stream --timeout=60 # send output as it comes
             echo "ABC" | python netcat.py -t 192.168.1.108 -p 135 # send data to remote
+            netcat.py -t 192.168.1.108 -p 5555 -f=big.iso       # send a file to an upload listener
             python netcat.py -t 192.168.1.108 -p 5555          # connect to server
         ''')
     )
 
     parser.add_argument('-c', '--command', action='store_true', help='initialize a command shell')
     parser.add_argument('-e', '--execute', help='execute specified command')
+    parser.add_argument('--stream', action='store_true',
+                        help='send command output to the client as it is produced instead of all at the end')
+    parser.add_argument('--timeout', type=float, help='with --stream, kill commands that run longer than this many seconds')
     parser.add_argument('-l', '--listen', action='store_true', help='listen mode')
+    parser.add_argument('--event-loop', action='store_true',
+                        help='serve --execute/--upload listeners from one asyncio loop instead of a thread per client')
+    parser.add_argument('--max-connections', type=int, default=10000,
+                        help='event loop: most clients served at once, extra ones are dropped')
+    parser.add_argument('--idle-timeout', type=float, default=60,
+                        help='event loop: seconds a client may stay silent before it is dropped (0 for never)')
     parser.add_argument('-p', '--port', type=int, default=5555, help='target port')
     parser.add_argument('-t', '--target', default='192.168.1.203', help='target IP')
     parser.add_argument('-u', '--upload', help='file to upload')
+    parser.add_argument('-f', '--file', help='send a file (- for stdin) and print the reply')
+    parser.add_argument('--chunked', action='store_true', help='send --file with read/sendall instead of sendfile')
+    parser.add_argument('--framing', choices=['none', 'delimiter', 'length'], default='none',
+                        help='how replies are delimited: not at all, by --delimiter, or by a 4-byte length prefix')
+    parser.add_argument('--delimiter', default='BHP: #> ',
+                        help='end-of-message marker for --framing delimiter (default: the command shell prompt)')
+    parser.add_argument('-b', '--buffer-size', type=int, default=65536, help='transfer buffer size in bytes')
+    parser.add_argument('--fsync', choices=['never', 'end', 'always'], default='never',
+                        help='when to fsync an upload: never, once at the end, or after every chunk')
+    metrics.add_arguments(parser)
 
     args = parser.parse_args()
+    if args.event_loop and args.command:
+        parser.error('--event-loop does not support --command')
+    if args.stream and args.framing == 'length':
+        parser.error('--stream output has no length to prefix; use --framing none or delimiter')
 
-    if args.listen:
+    if args.listen or args.file:
         buffer = ''
     else:
         buffer = sys.stdin.read()
@@ -1,26 +1,147 @@
+import argparse
+import multiprocessing
+import os
 import socket
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import mux
 
 IP = '0.0.0.0'
 PORT = 9998
 
-def handle_client(client_socket):
-    with client_socket as sock:
+def handle_client(client_socket, stats):
+    with client_socket as sock, stats.connection('ack') as counters:
         request = sock.recv(1024)
+        counters.bytes_in += len(request)
         print(f'[*] Received: {request.decode("utf-8")}')
-        sock.send(b'ACK')
+        counters.bytes_out += sock.send(b'ACK')
 
-def main():
+def handle_mux(client_socket, stats):
+    """Answer every request on a keep-alive multiplexed connection.
+
+    The client can pipeline requests, so each recv() may bring several;
+    their replies go back together in one sendall().
+    """
+    with client_socket as sock, stats.connection('mux') as counters:
+        buffer = bytearray()
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            counters.bytes_in += len(data)
+            buffer += data
+            try:
+                requests = mux.unpack_all(buffer)
+            except ValueError as e:
+                counters.error(e)
+                break
+            if requests:
+                reply = b''.join(mux.pack(request_id, b'ACK') for request_id, _ in requests)
+                sock.sendall(reply)
+                counters.bytes_out += len(reply)
+
+def make_server(ip, port, backlog, reuse_port=False):
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((IP, PORT))
-    server.listen(5)
-    print(f'[*] Listening on {IP}:{PORT}')
+    # Allow restarting on the port straight away when comparing modes.
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # Every process binds its own socket to the same port and the
+        # kernel spreads incoming connections across them.
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((ip, port))
+    server.listen(backlog)
+    return server
 
+def serve_threads(server, stats, handler=handle_client):
+    """Start a new thread for every client."""
     while True:
         client, address = server.accept()
         print(f'[*] Accepted connection from {address[0]}:{address[1]}')
-        client_handler = threading.Thread(target=handle_client, args=(client,))
+        client_handler = threading.Thread(target=handler, args=(client, stats))
         client_handler.start()
 
+def serve_pool(server, workers, stats, handler=handle_client):
+    """Hand clients to a fixed set of worker threads.
+
+    While every worker is busy the server stops accepting, so clients
+    beyond the number of workers wait in the kernel's backlog instead of
+    each costing a new thread or an open socket in the executor's queue.
+    """
+    idle = threading.BoundedSemaphore(workers)
+
+    def serve(client):
+        try:
+            handler(client, stats)
+        finally:
+            idle.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            idle.acquire()
+            client, address = server.accept()
+            print(f'[*] Accepted connection from {address[0]}:{address[1]}')
+            executor.submit(serve, client)
+
+def serve_reuseport(ip, port, backlog, workers, handler, stats_interval, stats_port):
+    with make_server(ip, port, backlog, reuse_port=True) as server:
+        print(f'[*] Process {os.getpid()} listening on {ip}:{port}')
+        stats = metrics.Metrics()
+        stats.expose(stats_interval, stats_port)
+        try:
+            serve_pool(server, workers, stats, handler)
+        except KeyboardInterrupt:
+            pass
+
+def main():
+    parser = argparse.ArgumentParser(description='BHP TCP Server')
+    parser.add_argument('-i', '--ip', default=IP, help='address to listen on')
+    parser.add_argument('-p', '--port', type=int, default=PORT, help='port to listen on')
+    parser.add_argument('-m', '--mode', choices=['thread', 'pool', 'reuseport'], default='thread',
+                        help='a thread per client, a fixed pool of threads, or a pool in each of '
+                             'several processes sharing the port')
+    parser.add_argument('--protocol', choices=['ack', 'mux'], default='ack',
+                        help='answer one request per connection with ACK, or keep connections open for '
+                             'length-prefixed requests with ids, as sent by TCP_Client.py --mux')
+    parser.add_argument('-b', '--backlog', type=int, default=5,
+                        help='connections the kernel queues before accept() takes them')
+    parser.add_argument('-w', '--workers', type=int, default=32, help='threads per pool')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='listening processes in reuseport mode (with --stats-port, process i serves its metrics on that port + i)')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    if args.mode == 'reuseport' and not hasattr(socket, 'SO_REUSEPORT'):
+        parser.error('this platform has no SO_REUSEPORT')
+    if args.protocol == 'mux' and args.mode != 'thread':
+        # A mux connection holds its thread for as long as it stays open,
+        # so connections beyond the pool size would never be answered.
+        parser.error('--protocol mux needs --mode thread')
+    handler = handle_mux if args.protocol == 'mux' else handle_client
+
+    if args.mode == 'reuseport':
+        processes = [multiprocessing.Process(target=serve_reuseport,
+                                             args=(args.ip, args.port, args.backlog, args.workers, handler,
+                                                   args.stats_interval,
+                                                   args.stats_port and args.stats_port + i))
+                     for i in range(args.processes)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    server = make_server(args.ip, args.port, args.backlog)
+    print(f'[*] Listening on {args.ip}:{args.port}')
+    stats = metrics.Metrics()
+    stats.expose(args.stats_interval, args.stats_port)
+    if args.mode == 'pool':
+        serve_pool(server, args.workers, stats, handler)
+    else:
+        serve_threads(server, stats, handler)
+
 if __name__ == '__main__':
-    main()
+    main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+import socket
+import threading
+import unittest
+
+from netcat import FramedReader
+
+
+class FramedReaderTest(unittest.TestCase):
+    def reader(self, chunks, framing='delimiter', delimiter=b'END', buffer_size=16):
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        right.settimeout(5)  # Fail rather than hang if a read never returns.
+
+        def send():
+            for chunk in chunks:
+                left.sendall(chunk)
+            left.shutdown(socket.SHUT_WR)
+        sender = threading.Thread(target=send)
+        sender.start()
+        self.addCleanup(sender.join)  # Cleanups run last in, first out.
+        return FramedReader(right, framing, delimiter, buffer_size)
+
+    def test_delimiter_after_buffer_compacts(self):
+        reader = self.reader([b'aaEND' + b'b' * 11, b'ccEND'])
+        self.assertEqual(reader.read_message(), 'aaEND')
+        self.assertEqual(reader.read_message(), 'b' * 11 + 'ccEND')
+        self.assertIsNone(reader.read_message())
+
+    def test_delimiter_split_between_reads(self):
+        reader = self.reader([b'helloE', b'N', b'Dworld', b'END'])
+        self.assertEqual(reader.read_message(), 'helloEND')
+        self.assertEqual(reader.read_message(), 'worldEND')
+
+    def test_message_bigger_than_buffer(self):
+        reader = self.reader([b'x' * 100 + b'END'])
+        self.assertEqual(reader.read_message(), 'x' * 100 + 'END')
+
+    def test_reply_cut_off_by_close(self):
+        reader = self.reader([b'Saved file to x\n'])
+        self.assertEqual(reader.read_message(), 'Saved file to x\n')
+        self.assertIsNone(reader.read_message())
+
+    def test_partial_character_at_close(self):
+        reader = self.reader(['\u00e9'.encode()[:1]])
+        self.assertEqual(reader.read_message(), '\ufffd')
+        self.assertIsNone(reader.read_message())
+
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -1,19 +1,147 @@
+import argparse
+import json
+import select
 import socket
+import struct
+import sys
+import time
+
+from metrics import Histogram
 
 target_host = "127.0.0.1"
 target_port = 9997
 
-# Create a UDP socket
-client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Every test datagram starts with its sequence number and the time it was
+# sent in nanoseconds; the rest is padding up to --size.
+HEADER = struct.Struct('!Iq')
+
+
+def send_one(host, port):
+    # Create a UDP socket
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    # Send some data
+    client.sendto(b"AAAABBBCCC", (host, port))
+
+    # Receive some data
+    data, addr = client.recvfrom(4096)
+
+    # Print the response
+    print(data.decode())
+
+    # Close the socket
+    client.close()
+
+
+def load_test(host, port, count, window, size, timeout):
+    """Send count datagrams to an echo server with up to window in flight.
+
+    The send and receive buffers are allocated once and reused: each
+    datagram's header is packed into the send buffer in place, and
+    recvfrom_into() drains every reply that is waiting after each
+    select(). A datagram whose echo hasn't come back within timeout
+    seconds counts as lost and frees its place in the window.
+    """
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.setblocking(False)
+    address = (host, port)
+    out = bytearray(max(size, HEADER.size))
+    buffer = bytearray(65536)
+    histogram = Histogram()
+    in_flight = {}  # Sequence number -> send time, oldest first.
+    timeout_ns = int(timeout * 1e9)
+    sent = lost = late = 0
+
+    start = time.perf_counter_ns()
+    while sent < count or in_flight:
+        while sent < count and len(in_flight) < window:
+            now = time.perf_counter_ns()
+            HEADER.pack_into(out, 0, sent, now)
+            try:
+                client.sendto(out, address)
+            except BlockingIOError:
+                break  # The kernel's send buffer is full; read replies first.
+            in_flight[sent] = now
+            sent += 1
+
+        now = time.perf_counter_ns()
+        while in_flight:
+            oldest = next(iter(in_flight))
+            if now - in_flight[oldest] < timeout_ns:
+                break
+            del in_flight[oldest]
+            lost += 1
+        if not in_flight:
+            continue
+
+        wait = (in_flight[next(iter(in_flight))] + timeout_ns - now) / 1e9
+        if not select.select([client], [], [], max(wait, 0))[0]:
+            continue
+        while True:
+            try:
+                nbytes, _ = client.recvfrom_into(buffer)
+            except BlockingIOError:
+                break
+            received = time.perf_counter_ns()
+            if nbytes < HEADER.size:
+                continue
+            seq, sent_at = HEADER.unpack_from(buffer)
+            if in_flight.pop(seq, None) is None:
+                late += 1  # Already counted as lost, or a duplicate.
+                continue
+            histogram.record((received - sent_at) / 1000)
+    seconds = (time.perf_counter_ns() - start) / 1e9
+    client.close()
+
+    return {
+        'target': f'{host}:{port}',
+        'sent': sent,
+        'received': histogram.total,
+        'lost': lost,
+        'loss_percent': round(100 * lost / sent, 3) if sent else 0,
+        'late': late,
+        'window': window,
+        'size': len(out),
+        'seconds': round(seconds, 3),
+        'packets_per_second': round(histogram.total / seconds, 1),
+        'rtt_us': histogram.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='BHP UDP Client',
+        epilog='With -n, load-test an echo server such as udp_server.py instead of sending one '
+               'datagram, e.g. udp_client.py -n 200000 -w 256 -s 512 --json out.json')
+    parser.add_argument('-t', '--target', default=target_host, help='host to send to')
+    parser.add_argument('-p', '--port', type=int, default=target_port, help='port to send to')
+    parser.add_argument('-n', '--count', type=int, help='datagrams to send')
+    parser.add_argument('-w', '--window', type=int, default=64, help='datagrams in flight at once')
+    parser.add_argument('-s', '--size', type=int, default=64, help='datagram size in bytes')
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help='seconds before an unanswered datagram counts as lost')
+    parser.add_argument('--json', help='write the results as JSON to this file, or - for stdout')
+    args = parser.parse_args()
 
-# Send some data
-client.sendto(b"AAAABBBCCC", (target_host, target_port))
+    if args.count is None:
+        send_one(args.target, args.port)
+        return
+    if args.count < 1 or args.window < 1 or not HEADER.size <= args.size <= 65507:
+        parser.error(f'--count and --window must be positive and --size between {HEADER.size} and 65507')
 
-# Receive some data
-data, addr = client.recvfrom(4096)
+    results = load_test(args.target, args.port, args.count, args.window, args.size, args.timeout)
+    rtt = results['rtt_us']
+    print(f'[*] {results["sent"]} sent, {results["received"]} received, {results["lost"]} lost '
+          f'({results["loss_percent"]}%) in {results["seconds"]}s: '
+          f'{results["packets_per_second"]} packets/s', file=sys.stderr)
+    print(f'[*] rtt (us) p50={rtt["p50"]} p95={rtt["p95"]} p99={rtt["p99"]} '
+          f'p999={rtt["p999"]} max={rtt["max"]}', file=sys.stderr)
+    if args.json == '-':
+        print(json.dumps(results, indent=2))
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
 
-# Print the response
-print(data.decode())
 
-# Close the socket
-client.close()
+if __name__ == '__main__':
+    main()
\ No newline at end of file
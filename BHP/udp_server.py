@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import socket
+
+IP = '0.0.0.0'
+PORT = 9997
+
+class EchoProtocol(asyncio.DatagramProtocol):
+    """Send every datagram straight back to where it came from."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.packets = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.packets += 1
+        if self.verbose:
+            print(f'[*] Received {len(data)} bytes from {addr[0]}:{addr[1]}')
+        self.transport.sendto(data, addr)
+
+    def error_received(self, exc):
+        print(f'[*] Error: {exc}')
+
+async def serve(ip, port, buffer_size, verbose):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if buffer_size:
+        # A bigger kernel buffer rides out bursts instead of dropping them.
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+    server.bind((ip, port))
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(lambda: EchoProtocol(verbose), sock=server)
+    print(f'[*] Listening on {ip}:{port}')
+    try:
+        await asyncio.Future()
+    finally:
+        transport.close()
+        print(f'[*] Echoed {protocol.packets} datagrams')
+
+def main():
+    parser = argparse.ArgumentParser(description='BHP UDP Echo Server')
+    parser.add_argument('-i', '--ip', default=IP, help='address to listen on')
+    parser.add_argument('-p', '--port', type=int, default=PORT, help='port to listen on')
+    parser.add_argument('-b', '--buffer-size', type=int, default=4 * 1024 * 1024,
+                        help='kernel send and receive buffer size in bytes (0 for the default)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every datagram')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.ip, args.port, args.buffer_size, args.verbose))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
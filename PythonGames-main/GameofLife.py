@@ -1,5 +1,11 @@
 __version__ = 0
-import copy, random, sys, time
+import argparse, importlib, random, sys
+
+from life_bench import benchmark, report
+from life_cycles import CycleDetector, runUntilCycle, smallestPeriod
+from life_patterns import isCheckpoint, loadPattern, openCheckpoint, saveCheckpoint
+from life_rules import CONWAY, ruleName, ruleTable
+from life_render import FrameLimiter, TerminalRenderer
 
 # Set up the constants:
 WIDTH = 80   # The width of the cell grid.
@@ -12,41 +18,52 @@ DEAD = ' '   # The character representing a dead cell.
 
 # (!) Try changing ALIVE to '|' and DEAD to '-'.
 
-# The cells and nextCells are dictionaries for the state of the game.
-# Their keys are (x, y) tuples and their values are one of the ALIVE
-# or DEAD values.
-nextCells = {}
-# Put random dead and alive cells into nextCells:
-for x in range(WIDTH):  # Loop over every possible column.
-    for y in range(HEIGHT):  # Loop over every possible row.
-        # 50/50 chance for starting cells being alive or dead.
-        if random.randint(0, 1) == 0:
-            nextCells[(x, y)] = ALIVE  # Add a living cell.
-        else:
-            nextCells[(x, y)] = DEAD  # Add a dead cell.
+# The lookup table for Conway's rules, B3/S23: dead cells are born with
+# 3 neighbors and living cells survive with 2 or 3.
+CONWAY_TABLE = ruleTable(CONWAY)
+
+# The engines that can step the simulation. Each one is a class taking
+# (width, height, grid) where grid is a bytearray of width * height
+# cells in row-major order (1 for alive, 0 for dead). Engines other than
+# 'dict' live in their own modules so their dependencies stay optional.
+ENGINES = {
+    'dict': (None, 'DictEngine'),
+    'numpy': ('life_numpy', 'NumpyEngine'),
+    'bitboard': ('life_bitboard', 'BitboardEngine'),
+    'hashlife': ('life_hashlife', 'HashLifeEngine'),
+    'sparse': ('life_sparse', 'SparseEngine'),
+    'parallel': ('life_parallel', 'ParallelEngine'),
+}
+
 
-while True:  # Main program loop.
-    # Each iteration of this loop is a step of the simulation.
+def getEngine(name):
+    """Return the engine class registered under name."""
+    moduleName, className = ENGINES[name]
+    if moduleName is None:
+        return globals()[className]
+    return getattr(importlib.import_module(moduleName), className)
 
-    print('\n' * 50)  # Separate each step with newlines.
-    cells = copy.deepcopy(nextCells)
 
-    # Print cells on the screen:
-    for y in range(HEIGHT):
-        for x in range(WIDTH):
-            print(cells[(x, y)], end='')  # Print the # or space.
-        print()  # Print a newline at the end of the row.
-    print('Press Ctrl-C to quit.')
+def randomGrid(width, height, seed=None):
+    """Return a grid where each cell has a 50/50 chance of being alive."""
+    rng = random.Random(seed)
+    return bytearray(rng.getrandbits(1) for i in range(width * height))
 
-    # Calculate the next step's cells based on current step's cells:
-    for x in range(WIDTH):
-        for y in range(HEIGHT):
+
+def stepCells(cells, width, height, table=CONWAY_TABLE):
+    """Return the next step's cells based on the current step's cells.
+
+    table is a rule lookup table from life_rules.ruleTable().
+    """
+    nextCells = {}
+    for x in range(width):
+        for y in range(height):
             # Get the neighboring coordinates of (x, y), even if they
             # wrap around the edge:
-            left  = (x - 1) % WIDTH
-            right = (x + 1) % WIDTH
-            above = (y - 1) % HEIGHT
-            below = (y + 1) % HEIGHT
+            left  = (x - 1) % width
+            right = (x + 1) % width
+            above = (y - 1) % height
+            below = (y + 1) % height
 
             # Count the number of living neighbors:
             numNeighbors = 0
@@ -67,20 +84,243 @@ while True:  # Main program loop.
             if cells[(right, below)] == ALIVE:
                 numNeighbors += 1  # Bottom-right neighbor is alive.
 
-            # Set cell based on Conway's Game of Life rules:
-            if cells[(x, y)] == ALIVE and (numNeighbors == 2
-                or numNeighbors == 3):
-                    # Living cells with 2 or 3 neighbors stay alive:
-                    nextCells[(x, y)] = ALIVE
-            elif cells[(x, y)] == DEAD and numNeighbors == 3:
-                # Dead cells with 3 neighbors become alive:
+            # Set cell based on the rule's table. For Conway's Game of
+            # Life, living cells with 2 or 3 neighbors stay alive, dead
+            # cells with 3 neighbors become alive, and everything else
+            # dies or stays dead:
+            if table[numNeighbors * 2 + (cells[(x, y)] == ALIVE)]:
                 nextCells[(x, y)] = ALIVE
             else:
-                # Everything else dies or stays dead:
                 nextCells[(x, y)] = DEAD
+    return nextCells
+
+
+class DictEngine:
+    """The original engine: a dict of (x, y) tuples to ALIVE or DEAD."""
+
+    def __init__(self, width, height, grid, rule=CONWAY):
+        self.width = width
+        self.height = height
+        self.table = ruleTable(rule)
+        # The cells dictionary holds the state of the game. Its keys are
+        # (x, y) tuples and its values are one of the ALIVE or DEAD values.
+        self.cells = {}
+        for y in range(height):
+            for x in range(width):
+                if grid[y * width + x]:
+                    self.cells[(x, y)] = ALIVE  # Add a living cell.
+                else:
+                    self.cells[(x, y)] = DEAD  # Add a dead cell.
+
+    def step(self, generations=1):
+        for i in range(generations):
+            self.cells = stepCells(self.cells, self.width, self.height, self.table)
+
+    def grid(self):
+        return bytearray(self.cells[(x, y)] == ALIVE
+                         for y in range(self.height)
+                         for x in range(self.width))
+
+
+def crossCheck(engineName, width, height, generations, seed=None, **options):
+    """Step engineName and the dict engine side by side from the same
+    random grid. Return the first generation where their cells differ, or
+    None if they agree for all of the generations."""
+    grid = randomGrid(width, height, seed)
+    reference = DictEngine(width, height, grid, options.get('rule', CONWAY))
+    engine = getEngine(engineName)(width, height, grid, **options)
+    for generation in range(1, generations + 1):
+        reference.step()
+        engine.step()
+        if engine.grid() != reference.grid():
+            return generation
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conway's Game of Life")
+    parser.add_argument('-e', '--engine', choices=sorted(ENGINES),
+                        default='dict', help='engine that steps the cells')
+    parser.add_argument('--width', type=int,
+                        help=f'width of the cell grid (default: {WIDTH}, or '
+                             'the size of the --load pattern)')
+    parser.add_argument('--height', type=int,
+                        help=f'height of the cell grid (default: {HEIGHT}, or '
+                             'the size of the --load pattern)')
+    parser.add_argument('--check', type=int, metavar='GENERATIONS',
+                        help='compare the engine against the dict engine '
+                             'for this many generations and exit')
+    parser.add_argument('--seed', type=int, help='seed for the random cells')
+    parser.add_argument('--rule',
+                        help=f'Life-like rule such as B36/S23 (default: {CONWAY}, '
+                             'or the rule of the --load pattern)')
+    parser.add_argument('--load', metavar='PATH',
+                        help='start from an RLE or plaintext pattern, or '
+                             'resume from a checkpoint, instead of random cells')
+    parser.add_argument('--save', metavar='PATH',
+                        help='write a checkpoint of the board to PATH on exit')
+    parser.add_argument('--step', type=int, default=1, metavar='GENERATIONS',
+                        help='generations to advance between screens')
+    parser.add_argument('--max-nodes', type=int,
+                        help='node cache cap for the hashlife engine')
+    parser.add_argument('--unbounded', action='store_true',
+                        help='let the sparse engine run on an infinite plane '
+                             'and show only the grid-sized window of it')
+    parser.add_argument('--workers', type=int,
+                        help='processes for the parallel engine '
+                             '(default: one per CPU)')
+    parser.add_argument('--fps', type=float, default=1,
+                        help='most screens to draw per second (0 for no limit)')
+    parser.add_argument('--benchmark', type=int, metavar='GENERATIONS',
+                        help='step this many generations without drawing, '
+                             'report the speed and exit')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write the --benchmark results to PATH')
+    parser.add_argument('--run', type=int, metavar='GENERATIONS',
+                        help='step this many generations without drawing, '
+                             'skipping ahead once the board repeats, and exit')
+    parser.add_argument('--stop-on-cycle', action='store_true',
+                        help='stop once the board repeats an earlier state')
+    parser.add_argument('--history', type=int, default=1024,
+                        help='longest cycle --run and --stop-on-cycle look for')
+    args = parser.parse_args()
+
+    options = {}
+    if args.rule is not None:
+        try:
+            options['rule'] = ruleName(args.rule)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.max_nodes is not None:
+        if args.engine != 'hashlife':
+            parser.error('--max-nodes only applies to the hashlife engine')
+        options['maxNodes'] = args.max_nodes
+    if args.unbounded:
+        if args.engine != 'sparse':
+            parser.error('--unbounded only applies to the sparse engine')
+        if args.run is not None or args.stop_on_cycle:
+            # The cycle check only sees the window, so a pattern that
+            # leaves it would look like an empty board repeating.
+            parser.error('--run and --stop-on-cycle cannot be used with --unbounded')
+        options['unbounded'] = True
+    if args.workers is not None:
+        if args.engine != 'parallel':
+            parser.error('--workers only applies to the parallel engine')
+        options['workers'] = args.workers
+
+    if args.check is not None:
+        try:
+            mismatch = crossCheck(args.engine, args.width or WIDTH,
+                                  args.height or HEIGHT,
+                                  args.check, args.seed, **options)
+        except ValueError as e:
+            parser.error(str(e))
+        if mismatch is None:
+            print(f'{args.engine} matches dict for {args.check} generations.')
+            sys.exit()
+        print(f'{args.engine} differs from dict at generation {mismatch}.')
+        sys.exit(1)
+
+    # Put the starting cells on the board:
+    generation = 0
+    seed = args.seed
+    if args.load:
+        try:
+            if isCheckpoint(args.load):
+                pattern, generation = openCheckpoint(args.load)
+            else:
+                pattern = loadPattern(args.load, args.width, args.height)
+        except (OSError, ValueError) as e:
+            parser.error(f'cannot load {args.load}: {e}')
+        width, height, grid = pattern.width, pattern.height, pattern.grid
+        if args.rule is None and pattern.rule is not None:
+            try:
+                options['rule'] = ruleName(pattern.rule)
+            except ValueError as e:
+                parser.error(f'cannot load {args.load}: {e}')
+    else:
+        width = args.width or WIDTH
+        height = args.height or HEIGHT
+        if args.benchmark is not None and seed is None:
+            seed = 0  # Benchmarks always use a fixed seed so runs can be compared.
+        grid = randomGrid(width, height, seed)
+
+    if args.benchmark is not None:
+        try:
+            result = benchmark(getEngine(args.engine), width, height,
+                               grid, args.benchmark, **options)
+        except ValueError as e:
+            parser.error(str(e))
+        result['engine'] = args.engine
+        result['seed'] = seed
+        result['pattern'] = args.load
+        report(result, args.json)
+        sys.exit()
 
     try:
-        time.sleep(1)  # Add a 1 second pause to reduce flickering.
+        engine = getEngine(args.engine)(width, height, grid, **options)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.run is not None:
+        period, found = runUntilCycle(engine, args.run, args.history)
+        generation += args.run
+        population = sum(engine.grid())
+        if period is None:
+            print(f'No cycle within {args.run} generations, '
+                  f'{population} cells alive.')
+        else:
+            print(f'Found a period {period} cycle at generation {found}, '
+                  f'skipped to generation {args.run}, {population} cells alive.')
+        if args.save:
+            saveCheckpoint(args.save, width, height, engine.grid(), generation)
+        sys.exit()
+
+    detector = None
+    if args.stop_on_cycle:
+        detector = CycleDetector(engine.grid(), args.history)
+
+    renderer = TerminalRenderer(width, height, ALIVE, DEAD,
+                                footer='Press Ctrl-C to quit.')
+    limiter = FrameLimiter(args.fps)
+    grid = engine.grid()
+    try:
+        while True:  # Main program loop.
+            # Each iteration of this loop is a step of the simulation.
+            # Only the cells that changed since the last step are redrawn.
+            renderer.draw(grid)
+
+            # Calculate the next step's cells based on current step's cells:
+            engine.step(args.step)
+            generation += args.step
+            grid = engine.grid()
+
+            if detector is not None:
+                period = detector.update(grid, args.step)
+                if period is not None:
+                    if args.step > 1:
+                        # The detector only saw every args.step-th board,
+                        # so the period it found may be a multiple.
+                        period = smallestPeriod(engine, period)
+                        grid = engine.grid()
+                    renderer.draw(grid)
+                    renderer.close()
+                    if args.save:
+                        saveCheckpoint(args.save, width, height, grid, generation)
+                    if period == 1:
+                        print('The board has settled into a still life.')
+                    else:
+                        print(f'The board repeats every {period} generations.')
+                    sys.exit()
+
+            limiter.wait()  # Pause so the steps can be followed.
     except KeyboardInterrupt:
+        renderer.close()
+        if args.save:
+            saveCheckpoint(args.save, width, height, grid, generation)
         print("Game of Life")
         sys.exit()  # When Ctrl-C is pressed, end the program.
+
+
+if __name__ == '__main__':
+    main()
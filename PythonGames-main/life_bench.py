@@ -0,0 +1,77 @@
+import json, sys, time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+
+def peakRss(children=False):
+    """Return the peak resident memory of this process in bytes, or None.
+
+    With children, return that of the largest child process that has
+    been waited for instead, or None if there are none.
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    if not peak:
+        return None
+    if sys.platform == 'darwin':
+        return peak  # macOS reports bytes...
+    return peak * 1024  # ...everyone else reports kilobytes.
+
+
+def benchmark(engineClass, width, height, grid, generations, **options):
+    """Step a new engine through generations without drawing anything.
+
+    Return a dict of the timings, ready to be printed or dumped as JSON.
+    Setting up the engine is timed separately from stepping it.
+    """
+    start = time.perf_counter()
+    engine = engineClass(width, height, grid, **options)
+    setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.step(generations)
+    seconds = time.perf_counter() - start
+
+    # Engines with workers have a close() that reaps them, after which
+    # their memory shows up as this process's children. peak_rss_bytes
+    # is the parent's alone.
+    childRss = None
+    close = getattr(engine, 'close', None)
+    if close is not None:
+        close()
+        childRss = peakRss(children=True)
+    return {
+        'width': width,
+        'height': height,
+        'generations': generations,
+        'options': options,
+        'setup_seconds': setup,
+        'seconds': seconds,
+        'generations_per_second': generations / seconds if seconds else None,
+        'cell_updates_per_second': generations * width * height / seconds if seconds else None,
+        'peak_rss_bytes': peakRss(),
+        'peak_child_rss_bytes': childRss,
+    }
+
+
+def report(result, jsonPath=None):
+    """Print result and, if jsonPath is given, write it there as JSON."""
+    print(f"{result['engine']} {result['width']}x{result['height']}, "
+          f"{result['generations']} generations in {result['seconds']:.3f} s")
+    if result['seconds']:
+        print(f"  {result['generations_per_second']:,.1f} generations/sec")
+        print(f"  {result['cell_updates_per_second']:,.0f} cell updates/sec")
+    if result['peak_rss_bytes'] is not None:
+        print(f"  {result['peak_rss_bytes'] / 2 ** 20:,.1f} MiB peak RSS")
+    if result['peak_child_rss_bytes'] is not None:
+        print(f"  {result['peak_child_rss_bytes'] / 2 ** 20:,.1f} MiB peak RSS "
+              f"of the largest worker process")
+    if jsonPath:
+        with open(jsonPath, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
@@ -0,0 +1,106 @@
+from life_rules import CONWAY, ruleTable
+
+ZEROS_ONES = bytes.maketrans(b'\x00\x01', b'01')
+ONES_ZEROS = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def compileTerms(table):
+    """Turn a rule lookup table into the terms BitboardEngine.step ORs.
+
+    Each term is five indexes into the values tuple built for every row:
+    0-3 are the neighbor count's binary digits 1, 2, 4 and 8, 4-7 their
+    inverses, 8 the row itself, 9 its inverse and 10 all ones. A count that
+    is alive whatever the cell's state gets a single term that ignores it.
+    """
+    terms = []
+    for numNeighbors in range(9):
+        digits = tuple(bit if numNeighbors >> bit & 1 else bit + 4 for bit in range(4))
+        dead, alive = table[numNeighbors * 2], table[numNeighbors * 2 + 1]
+        if dead and alive:
+            terms.append(digits + (10,))
+        elif alive:
+            terms.append(digits + (8,))
+        elif dead:
+            terms.append(digits + (9,))
+    return terms
+
+
+class BitboardEngine:
+    """Game of Life engine that packs each row of cells into a Python int.
+
+    Bit x of rows[y] is the cell at (x, y), so a row costs one bit per cell
+    instead of a dict entry per cell. The rule is evaluated for a whole
+    row at once with bit-parallel (SWAR) adder logic: every bit position
+    runs its own little neighbour counter in lockstep.
+    """
+
+    def __init__(self, width, height, grid, rule=CONWAY):
+        self.width = width
+        self.height = height
+        self.mask = (1 << width) - 1
+        self.terms = compileTerms(ruleTable(rule))
+        self.rows = []
+        for y in range(height):
+            row = bytes(grid[y * width:(y + 1) * width]).translate(ZEROS_ONES)
+            self.rows.append(int(row[::-1], 2))
+
+    def sums(self, row):
+        """Return the neighbour sums of each bit of row along the row.
+
+        The first pair is left + self + right as (ones, twos) bits, the
+        second pair is left + right without the cell itself. Shifting by
+        one and wrapping the end bit around gives the torus wrap.
+        """
+        w = self.width
+        left = ((row << 1) | (row >> (w - 1))) & self.mask
+        right = (row >> 1) | ((row & 1) << (w - 1))
+        pairOnes = left ^ right
+        pairTwos = left & right
+        tripleOnes = pairOnes ^ row
+        tripleTwos = pairTwos | (pairOnes & row)
+        return tripleOnes, tripleTwos, pairOnes, pairTwos
+
+    def step(self, generations=1):
+        h = self.height
+        mask = self.mask
+        terms = self.terms
+        for i in range(generations):
+            rows = self.rows
+            sums = [self.sums(row) for row in rows]
+            nextRows = []
+            for y in range(h):
+                a1, a2 = sums[(y - 1) % h][:2]  # Row above, all three cells.
+                m1, m2 = sums[y][2:]  # This row, left and right only.
+                b1, b2 = sums[(y + 1) % h][:2]  # Row below, all three cells.
+
+                # Add the three counts bit by bit. s1, s2, s4 and s8 are the
+                # binary digits of each cell's number of living neighbors:
+                t = a1 ^ m1
+                s1 = t ^ b1
+                carry = (a1 & m1) | (t & b1)
+                p = a2 ^ m2
+                q = b2 ^ carry
+                s2 = p ^ q
+                k1 = a2 & m2
+                k2 = b2 & carry
+                k3 = p & q
+                s4 = k1 ^ k2 ^ k3
+                s8 = (k1 & k2) | (k1 & k3) | (k2 & k3)
+
+                # OR together the cells matching each live entry of the
+                # rule table. Each term picks the digits (or their
+                # inverses) of its neighbor count and the cell's state:
+                row = rows[y]
+                values = (s1, s2, s4, s8, s1 ^ mask, s2 ^ mask, s4 ^ mask,
+                          s8 ^ mask, row, row ^ mask, mask)
+                nextRow = 0
+                for a, b, c, d, e in terms:
+                    nextRow |= values[a] & values[b] & values[c] & values[d] & values[e]
+                nextRows.append(nextRow)
+            self.rows = nextRows
+
+    def grid(self):
+        grid = bytearray()
+        for row in self.rows:
+            grid += format(row, '0%db' % self.width)[::-1].encode().translate(ONES_ZEROS)
+        return grid
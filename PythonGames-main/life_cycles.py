@@ -0,0 +1,104 @@
+from collections import deque
+
+MASK64 = (1 << 64) - 1
+
+
+def cellKey(index):
+    """Return the 64-bit Zobrist key of a cell.
+
+    Keys come from the splitmix64 mixer instead of a table of random
+    numbers, so a 10000x10000 board doesn't need 800 MB of keys.
+    """
+    z = (index * 0x9E3779B97F4A7C15 + 0x632BE59BD9B4E019) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def changedCells(old, new):
+    """Yield the indexes of the cells that differ between two grids."""
+    size = len(new)
+    diff = (int.from_bytes(old, 'big') ^ int.from_bytes(new, 'big')).to_bytes(size, 'big')
+    # Both grids hold only 0s and 1s, so the changed cells are the 1s in
+    # diff; find() skips the unchanged runs at C speed.
+    i = diff.find(1)
+    while i != -1:
+        yield i
+        i = diff.find(1, i + 1)
+
+
+class CycleDetector:
+    """Spot when a board repeats one of its recent states.
+
+    The board hash is the XOR of the keys of its living cells, so each
+    generation only the cells that changed are XORed in or out. The last
+    `history` hashes are kept, which finds any cycle with a period up to
+    that length, still lifes (period 1) included. Two different boards
+    share a hash with odds of about 1 in 2**64 per comparison.
+    """
+
+    def __init__(self, grid, history=1024):
+        self.grid = bytes(grid)
+        self.hash = 0
+        for i in changedCells(bytes(len(grid)), self.grid):
+            self.hash ^= cellKey(i)
+        self.generation = 0
+        self.history = history
+        self.seen = {self.hash: 0}
+        self.order = deque([self.hash])
+
+    def update(self, grid, generations=1):
+        """Record the board generations after the last one.
+
+        Return the period of the cycle if this board was seen before, or
+        None. The cycle started at generation self.generation - period.
+        """
+        grid = bytes(grid)
+        for i in changedCells(self.grid, grid):
+            self.hash ^= cellKey(i)
+        self.grid = grid
+        self.generation += generations
+
+        first = self.seen.get(self.hash)
+        if first is not None:
+            return self.generation - first
+        self.seen[self.hash] = self.generation
+        self.order.append(self.hash)
+        if len(self.order) > self.history:
+            del self.seen[self.order.popleft()]
+        return None
+
+
+def smallestPeriod(engine, period):
+    """Return the smallest period of a board that repeats every period.
+
+    The smallest period divides period, so stepping one generation at a
+    time finds it within period steps, leaving the engine on the board
+    it started from.
+    """
+    start = bytes(engine.grid())
+    for generations in range(1, period):
+        engine.step()
+        if bytes(engine.grid()) == start:
+            return generations
+    engine.step()
+    return period
+
+
+def runUntilCycle(engine, generations, history=1024):
+    """Step engine through generations, skipping ahead once it repeats.
+
+    As soon as the board repeats, the rest of the run is only whole laps
+    of the cycle, so just the leftover part of a lap is stepped. Return
+    (period, generation the cycle was found at); both are None if the
+    board never repeated.
+    """
+    detector = CycleDetector(engine.grid(), history)
+    while detector.generation < generations:
+        engine.step()
+        period = detector.update(engine.grid())
+        if period is not None:
+            found = detector.generation
+            engine.step((generations - found) % period)
+            return period, found
+    return None, None
@@ -0,0 +1,217 @@
+from life_rules import CONWAY, bornFromNothing, ruleTable
+
+MAX_NODES = 2000000  # Roughly 200 bytes per node, so about 400 MB.
+
+
+class Node:
+    """A square of 2**level cells made of four quadrants of half the size.
+
+    Nodes are canonical: HashLife.join returns the same Node object for
+    the same four quadrants, so equal squares share storage and results.
+    Level 0 nodes are single cells and have no quadrants.
+    """
+
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'population')
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.level = level
+        self.population = population
+
+
+class HashLife:
+    """Memoized quadtree (HashLife) evaluation of a Life-like rule.
+
+    lookup is the rule's table of next states, table canonicalizes nodes
+    by their quadrants and results memoizes successor(). maxNodes caps
+    the table between calls of successor(): collect() keeps only the
+    nodes the caller still holds and drops every memoized result. A
+    single call can go over the cap, as evicting in the middle of one
+    throws away the work it is about to reuse.
+    """
+
+    def __init__(self, maxNodes=MAX_NODES, rule=CONWAY):
+        self.maxNodes = maxNodes
+        self.lookup = ruleTable(rule)
+        if bornFromNothing(self.lookup):
+            raise ValueError('the hashlife engine cannot run B0 rules')
+        self.table = {}
+        self.results = {}
+        self.evictions = 0
+        self.dead = Node(None, None, None, None, 0, 0)
+        self.alive = Node(None, None, None, None, 0, 1)
+
+    def collect(self, *roots):
+        """Drop every node not reachable from roots if over the cap."""
+        if len(self.table) < self.maxNodes:
+            return
+        table = {}
+        stack = [root for root in roots if root.level > 0]
+        while stack:
+            node = stack.pop()
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key in table:
+                continue
+            table[key] = node
+            if node.level > 1:
+                stack.extend(key)
+        self.table = table
+        self.results.clear()
+        self.evictions += 1
+
+    def join(self, nw, ne, sw, se):
+        """Return the canonical node with the four given quadrants."""
+        key = (nw, ne, sw, se)
+        node = self.table.get(key)
+        if node is None:
+            node = Node(nw, ne, sw, se, nw.level + 1,
+                        nw.population + ne.population + sw.population + se.population)
+            self.table[key] = node
+        return node
+
+    def tile(self, node):
+        """Return a node twice the size made of four copies of node."""
+        return self.join(node, node, node, node)
+
+    def base(self, node):
+        """Return the center 2x2 of a 4x4 node one generation later."""
+        cells = [[0] * 4 for y in range(4)]
+        for qy, row in enumerate(((node.nw, node.ne), (node.sw, node.se))):
+            for qx, quadrant in enumerate(row):
+                cells[qy * 2][qx * 2] = quadrant.nw.population
+                cells[qy * 2][qx * 2 + 1] = quadrant.ne.population
+                cells[qy * 2 + 1][qx * 2] = quadrant.sw.population
+                cells[qy * 2 + 1][qx * 2 + 1] = quadrant.se.population
+        center = []
+        for y in (1, 2):
+            for x in (1, 2):
+                numNeighbors = sum(cells[y + dy][x + dx]
+                                   for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                                   if dx or dy)
+                if self.lookup[numNeighbors * 2 + cells[y][x]]:
+                    center.append(self.alive)
+                else:
+                    center.append(self.dead)
+        return self.join(*center)
+
+    def successor(self, node, j):
+        """Return the center half of node advanced 2**j generations.
+
+        j may be at most node.level - 2, which is as far as the light
+        cone of the node reaches into its center.
+        """
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+        if node.population == 0:
+            result = node.nw
+        elif node.level == 2:
+            result = self.base(node)
+        else:
+            join = self.join
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            # The nine overlapping sub-squares of half the size, each
+            # advanced to give a quarter-size center. A half-size square
+            # can only be advanced up to 2**(level - 3) generations.
+            i = min(j, node.level - 3)
+            c1 = self.successor(nw, i)
+            c2 = self.successor(join(nw.ne, ne.nw, nw.se, ne.sw), i)
+            c3 = self.successor(ne, i)
+            c4 = self.successor(join(nw.sw, nw.se, sw.nw, sw.ne), i)
+            c5 = self.successor(join(nw.se, ne.sw, sw.ne, se.nw), i)
+            c6 = self.successor(join(ne.sw, ne.se, se.nw, se.ne), i)
+            c7 = self.successor(sw, i)
+            c8 = self.successor(join(sw.ne, se.nw, sw.se, se.sw), i)
+            c9 = self.successor(se, i)
+            if j < node.level - 2:
+                # The nine centers are already 2**j generations on, so
+                # just stitch the middle of them together.
+                result = join(join(c1.se, c2.sw, c4.ne, c5.nw),
+                              join(c2.se, c3.sw, c5.ne, c6.nw),
+                              join(c4.se, c5.sw, c7.ne, c8.nw),
+                              join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                # Each half was only advanced 2**(j - 1) generations, so
+                # advance the four overlapping quarters once more.
+                result = join(self.successor(join(c1, c2, c4, c5), j - 1),
+                              self.successor(join(c2, c3, c5, c6), j - 1),
+                              self.successor(join(c4, c5, c7, c8), j - 1),
+                              self.successor(join(c5, c6, c8, c9), j - 1))
+        self.results[key] = result
+        return result
+
+
+class HashLifeEngine:
+    """Game of Life engine that jumps 2**k generations at a time.
+
+    The torus is treated as an infinite plane tiled with copies of itself.
+    Because tiles are canonical nodes, a tiled plane of any size costs a
+    handful of extra nodes, and the center of an advanced plane is again a
+    whole number of tiles. This needs the width and height to be powers
+    of two so the tiles line up with the quadtree.
+    """
+
+    def __init__(self, width, height, grid, maxNodes=MAX_NODES, rule=CONWAY):
+        for size in (width, height):
+            if size < 1 or size & (size - 1):
+                raise ValueError('hashlife needs a power of two width and height')
+        self.width = width
+        self.height = height
+        self.life = HashLife(maxNodes, rule)
+        self.level = max(width, height, 4).bit_length() - 1
+
+        # Build the quadtree bottom up, one level at a time:
+        size = 1 << self.level
+        squares = [[self.life.alive if grid[(y % height) * width + x % width]
+                    else self.life.dead for x in range(size)]
+                   for y in range(size)]
+        while size > 1:
+            size //= 2
+            squares = [[self.life.join(squares[2 * y][2 * x],
+                                       squares[2 * y][2 * x + 1],
+                                       squares[2 * y + 1][2 * x],
+                                       squares[2 * y + 1][2 * x + 1])
+                        for x in range(size)] for y in range(size)]
+        self.root = squares[0][0]
+
+    def advance(self, j):
+        """Advance the torus 2**j generations."""
+        node = self.root
+        # The plane must be big enough both for the light cone of 2**j
+        # generations and for its center to start on a tile boundary.
+        while node.level < max(self.level + 2, j + 2):
+            node = self.life.tile(node)
+        node = self.life.successor(node, j)
+        while node.level > self.level:
+            node = node.nw
+        self.root = node
+        self.life.collect(self.root)
+
+    def step(self, generations=1):
+        j = 0
+        while generations:
+            if generations & 1:
+                self.advance(j)
+            generations >>= 1
+            j += 1
+
+    def grid(self):
+        grid = bytearray(self.width * self.height)
+        stack = [(self.root, 0, 0)]
+        while stack:
+            node, x, y = stack.pop()
+            if node.population == 0 or x >= self.width or y >= self.height:
+                continue
+            if node.level == 0:
+                grid[y * self.width + x] = 1
+                continue
+            half = 1 << (node.level - 1)
+            stack.append((node.nw, x, y))
+            stack.append((node.ne, x + half, y))
+            stack.append((node.sw, x, y + half))
+            stack.append((node.se, x + half, y + half))
+        return grid
@@ -0,0 +1,114 @@
+import numpy as np
+
+from life_rules import CONWAY, ruleTable
+
+
+def compileRule(table):
+    """Sort the neighbor counts of a rule table by what they do.
+
+    Return (always, birth, survival): the counts that leave a cell alive
+    whatever its state, only if it was dead, and only if it was alive.
+    Conway's rule is ((3,), (), (2,)).
+    """
+    always, birth, survival = [], [], []
+    for numNeighbors in range(9):
+        dead, alive = table[numNeighbors * 2], table[numNeighbors * 2 + 1]
+        if dead and alive:
+            always.append(numNeighbors)
+        elif dead:
+            birth.append(numNeighbors)
+        elif alive:
+            survival.append(numNeighbors)
+    return tuple(always), tuple(birth), tuple(survival)
+
+
+def matchCounts(n, values, out, scratch):
+    """Set out to whether each neighbor count in n is one of values."""
+    np.equal(n, values[0], out=out)
+    for value in values[1:]:
+        np.equal(n, value, out=scratch)
+        np.logical_or(out, scratch, out=out)
+
+
+def stepPadded(padded, out, counts, alive, term, rule):
+    """Write the next generation of the cells inside padded into out.
+
+    padded holds the cells with a one-cell halo of their neighbors around
+    them, counts (uint8) and alive and term (bool) are scratch arrays the
+    size of the cells and rule comes from compileRule(). out may be the
+    inside of padded itself, as the neighbor counts are all taken before
+    anything is written.
+    """
+    p = padded
+    n = counts
+    h, w = counts.shape
+    always, birth, survival = rule
+    cells = p[1:h + 1, 1:w + 1]
+
+    # Count the living neighbors by adding the eight shifted views:
+    np.add(p[0:h, 0:w], p[0:h, 1:w + 1], out=n)
+    np.add(n, p[0:h, 2:w + 2], out=n)
+    np.add(n, p[1:h + 1, 0:w], out=n)
+    np.add(n, p[1:h + 1, 2:w + 2], out=n)
+    np.add(n, p[2:h + 2, 0:w], out=n)
+    np.add(n, p[2:h + 2, 1:w + 1], out=n)
+    np.add(n, p[2:h + 2, 2:w + 2], out=n)
+
+    # Compare the counts with just the values the rule names, so Conway's
+    # rule costs two comparisons: alive = n == 3 or (n == 2 and alive).
+    # np.greater(match, cells) is "match and dead" for the birth counts.
+    started = False
+    for values, state in ((always, None), (survival, np.logical_and),
+                          (birth, np.greater)):
+        if not started and values:
+            matchCounts(n, values, alive, term)
+            if state is not None:
+                state(alive, cells, out=alive)
+            started = True
+            continue
+        for value in values:
+            np.equal(n, value, out=term)
+            if state is not None:
+                state(term, cells, out=term)
+            np.logical_or(alive, term, out=alive)
+    if not started:
+        alive[...] = False
+    out[...] = alive
+
+
+class NumpyEngine:
+    """Game of Life engine that keeps the grid in a uint8 NumPy array.
+
+    The cells live inside a padded array with a one-cell halo around the
+    edge. Before each step the halo is filled with the opposite edge, which
+    gives the same torus wrap as the `% WIDTH` / `% HEIGHT` lookups in the
+    dict engine, and the neighbour counts are then eight shifted slice sums.
+    """
+
+    def __init__(self, width, height, grid, rule=CONWAY):
+        self.width = width
+        self.height = height
+        self.rule = compileRule(ruleTable(rule))
+        self.padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        self.cells = self.padded[1:-1, 1:-1]
+        self.cells[...] = np.frombuffer(grid, dtype=np.uint8).reshape(height, width)
+        # Scratch buffers reused every generation so stepping does not allocate.
+        self.counts = np.empty((height, width), dtype=np.uint8)
+        self.alive = np.empty((height, width), dtype=bool)
+        self.term = np.empty((height, width), dtype=bool)
+
+    def wrap(self):
+        """Copy the opposite edges into the halo around the cells."""
+        p = self.padded
+        p[0, 1:-1] = p[-2, 1:-1]  # Top halo is the bottom row.
+        p[-1, 1:-1] = p[1, 1:-1]  # Bottom halo is the top row.
+        p[:, 0] = p[:, -2]  # Left halo (with corners) is the right column.
+        p[:, -1] = p[:, 1]  # Right halo (with corners) is the left column.
+
+    def step(self, generations=1):
+        for i in range(generations):
+            self.wrap()
+            stepPadded(self.padded, self.cells, self.counts, self.alive, self.term, self.rule)
+
+    def grid(self):
+        return bytearray(self.cells.tobytes())
@@ -0,0 +1,93 @@
+import multiprocessing, os, weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from life_numpy import compileRule, stepPadded
+from life_rules import CONWAY, ruleTable
+
+# Set in each worker process by attach():
+boards = None
+memories = None
+compiled = None
+scratch = {}
+
+
+def attach(names, width, height, rule):
+    """Map the two shared boards into a worker process."""
+    global boards, memories, compiled
+    compiled = compileRule(ruleTable(rule))
+    memories = [shared_memory.SharedMemory(name=name) for name in names]
+    boards = [np.ndarray((height, width), dtype=np.uint8, buffer=memory.buf)
+              for memory in memories]
+
+
+def stepStripe(task):
+    """Step rows y0 to y1 of board source into the other board."""
+    source, y0, y1 = task
+    cells = boards[source]
+    out = boards[1 - source]
+    height, width = cells.shape
+    rows = y1 - y0
+    if rows not in scratch:
+        scratch[rows] = (np.empty((rows + 2, width + 2), dtype=np.uint8),
+                         np.empty((rows, width), dtype=np.uint8),
+                         np.empty((rows, width), dtype=bool),
+                         np.empty((rows, width), dtype=bool))
+    padded, counts, alive, term = scratch[rows]
+
+    # The halo rows are the edge rows of the stripes above and below,
+    # which nobody writes to until every stripe has finished this step.
+    padded[0, 1:-1] = cells[(y0 - 1) % height]
+    padded[1:-1, 1:-1] = cells[y0:y1]
+    padded[-1, 1:-1] = cells[y1 % height]
+    padded[:, 0] = padded[:, -2]
+    padded[:, -1] = padded[:, 1]
+    stepPadded(padded, out[y0:y1], counts, alive, term, compiled)
+
+
+def release(pool, memories):
+    pool.terminate()
+    for memory in memories:
+        memory.close()
+        memory.unlink()
+
+
+class ParallelEngine:
+    """Game of Life engine that steps horizontal stripes in a process pool.
+
+    The board is double buffered in two blocks of shared memory. Each
+    generation every worker reads its stripe plus one halo row above and
+    below from the current board and writes its stripe of the next board,
+    then the two boards swap. The rule is the same stepPadded() as the
+    numpy engine, so the results match it bit for bit.
+    """
+
+    def __init__(self, width, height, grid, workers=None, rule=CONWAY):
+        self.width = width
+        self.height = height
+        workers = min(workers or os.cpu_count(), height)
+        self.memories = [shared_memory.SharedMemory(create=True, size=width * height)
+                         for i in range(2)]
+        self.boards = [np.ndarray((height, width), dtype=np.uint8, buffer=memory.buf)
+                       for memory in self.memories]
+        self.boards[0][...] = np.frombuffer(grid, dtype=np.uint8).reshape(height, width)
+        self.current = 0
+        bounds = [height * i // workers for i in range(workers + 1)]
+        self.stripes = list(zip(bounds, bounds[1:]))
+        self.pool = multiprocessing.Pool(
+            workers, attach, ([memory.name for memory in self.memories], width, height, rule))
+        self.finalizer = weakref.finalize(self, release, self.pool, self.memories)
+
+    def step(self, generations=1):
+        for i in range(generations):
+            self.pool.map(stepStripe, [(self.current, y0, y1) for y0, y1 in self.stripes])
+            self.current = 1 - self.current
+
+    def grid(self):
+        return bytearray(self.boards[self.current].tobytes())
+
+    def close(self):
+        """Stop the workers and free the shared memory."""
+        self.boards = None
+        self.finalizer()
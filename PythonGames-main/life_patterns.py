@@ -0,0 +1,162 @@
+import mmap, os, re, struct
+from collections import namedtuple
+
+CHUNK_SIZE = 1 << 20  # Bytes read from a pattern file at a time.
+
+# A loaded board. grid holds width * height cells in row-major order, 1 for
+# alive and 0 for dead, like every engine expects. rule is the rule string
+# the file asks for, or None.
+Pattern = namedtuple('Pattern', 'width height grid rule')
+
+RLE_HEADER = re.compile(rb'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*(\S+))?')
+RLE_TOKEN = re.compile(rb'(\d*)([^\d])')
+TRAILING_DIGITS = re.compile(rb'\d*$')
+WHITESPACE = b' \t\r\n'
+
+# Checkpoints are a fixed header followed by the grid itself, one byte
+# per cell. That is bigger on disk than a bit per cell, but it means the
+# memory-mapped file can be handed to an engine as its grid as-is, so
+# resuming costs nothing until the engine reads the cells.
+CHECKPOINT_MAGIC = b'LIFE'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct('<4sHxxIIQ')  # magic, version, width, height, generation
+
+
+def placement(width, height, patternWidth, patternHeight):
+    """Return the board size and the offset that centers the pattern on it."""
+    width = width or patternWidth
+    height = height or patternHeight
+    if patternWidth > width or patternHeight > height:
+        raise ValueError(f'the {patternWidth}x{patternHeight} pattern does not '
+                         f'fit on a {width}x{height} board')
+    return width, height, (width - patternWidth) // 2, (height - patternHeight) // 2
+
+
+def readRle(f, width=None, height=None):
+    """Read an RLE pattern from the binary file f, one chunk at a time."""
+    line = f.readline()
+    while line.startswith(b'#') or not line.strip():
+        if not line:
+            raise ValueError('RLE pattern has no "x = ..., y = ..." header')
+        line = f.readline()
+    header = RLE_HEADER.match(line.strip())
+    if header is None:
+        raise ValueError(f'bad RLE header: {line.strip().decode(errors="replace")}')
+    patternWidth, patternHeight = int(header.group(1)), int(header.group(2))
+    rule = header.group(3).decode() if header.group(3) else None
+    width, height, left, top = placement(width, height, patternWidth, patternHeight)
+
+    grid = bytearray(width * height)
+    ones = memoryview(b'\x01' * patternWidth)
+    x = y = 0
+    pending = b''
+    runLengths = {b'': 1}
+    while True:
+        data = f.read(CHUNK_SIZE)
+        chunk = pending + data.translate(None, WHITESPACE)
+        if data:
+            # A run count can be split across two chunks; keep its digits
+            # for the next one.
+            cut = TRAILING_DIGITS.search(chunk).start()
+            chunk, pending = chunk[:cut], chunk[cut:]
+        for count, tag in RLE_TOKEN.findall(chunk):
+            # Run counts repeat a lot, so parse each distinct one only once.
+            n = runLengths.get(count)
+            if n is None:
+                n = runLengths[count] = int(count)
+            count = n
+            if tag == b'b' or tag == b'.':
+                x += count  # Dead cells are already 0.
+            elif tag == b'$':
+                x = 0
+                y += count
+            elif tag == b'!':
+                return Pattern(width, height, grid, rule)
+            else:
+                if x + count > patternWidth or y >= patternHeight:
+                    raise ValueError('RLE pattern is bigger than its header says')
+                start = (top + y) * width + left + x
+                grid[start:start + count] = ones[:count]
+                x += count
+        if not data:
+            return Pattern(width, height, grid, rule)
+
+
+def readPlaintext(f, width=None, height=None):
+    """Read a plaintext (.cells) pattern from the binary file f.
+
+    Plaintext has no header, so the file is read twice: once to measure
+    the pattern and once to fill in the cells.
+    """
+    patternWidth = patternHeight = 0
+    for line in f:
+        if not line.startswith(b'!'):
+            patternWidth = max(patternWidth, len(line.rstrip()))
+            patternHeight += 1
+    width, height, left, top = placement(width, height, patternWidth, patternHeight)
+
+    grid = bytearray(width * height)
+    f.seek(0)
+    y = 0
+    for line in f:
+        if line.startswith(b'!'):
+            continue
+        start = (top + y) * width + left
+        for x, char in enumerate(line.rstrip()):
+            if char != 46:  # Anything but '.' is alive.
+                grid[start + x] = 1
+        y += 1
+    return Pattern(width, height, grid, None)
+
+
+def loadPattern(path, width=None, height=None):
+    """Load an RLE or plaintext pattern file, centered on a board.
+
+    The board is width x height, or just big enough for the pattern if
+    those are not given.
+    """
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.startswith((b'#', b'!')) or not line.strip():
+                continue
+            isRle = line.lstrip().startswith(b'x')
+            break
+        else:
+            raise ValueError(f'{path} has no cells in it')
+        f.seek(0)
+        if isRle:
+            return readRle(f, width, height)
+        return readPlaintext(f, width, height)
+
+
+def isCheckpoint(path):
+    with open(path, 'rb') as f:
+        return f.read(len(CHECKPOINT_MAGIC)) == CHECKPOINT_MAGIC
+
+
+def saveCheckpoint(path, width, height, grid, generation=0):
+    """Write grid to path as a checkpoint, replacing it atomically."""
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION,
+                                       width, height, generation))
+        f.write(grid)
+    os.replace(temp, path)
+
+
+def openCheckpoint(path):
+    """Memory-map a checkpoint. Return (Pattern, generation).
+
+    The grid in the pattern is a read-only view of the mapped file.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapped) < CHECKPOINT_HEADER.size:
+        raise ValueError(f'{path} is truncated')
+    magic, version, width, height, generation = CHECKPOINT_HEADER.unpack_from(mapped)
+    if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+        raise ValueError(f'{path} is not a version {CHECKPOINT_VERSION} checkpoint')
+    if len(mapped) != CHECKPOINT_HEADER.size + width * height:
+        raise ValueError(f'{path} is truncated')
+    grid = memoryview(mapped)[CHECKPOINT_HEADER.size:]
+    return Pattern(width, height, grid, None), generation
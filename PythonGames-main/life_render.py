@@ -0,0 +1,101 @@
+import sys, time
+
+CLEAR = '\x1b[2J'
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+
+
+def moveTo(row, column):
+    """Return the ANSI code that moves the cursor to row, column (from 0)."""
+    return f'\x1b[{row + 1};{column + 1}H'
+
+
+class TerminalRenderer:
+    """Draw grids on an ANSI terminal, redrawing only the cells that changed.
+
+    Each frame is built in a list of strings and sent with a single
+    write(). The first frame clears the screen and draws every cell; after
+    that each changed cell is drawn in place after a cursor move, and runs
+    of changed cells next to each other share a single cursor move.
+    """
+
+    def __init__(self, width, height, alive, dead, footer='', out=sys.stdout):
+        self.width = width
+        self.height = height
+        # Every cell takes the same number of columns so cells can be
+        # addressed with the cursor.
+        cellWidth = max(len(alive), len(dead))
+        self.cellWidth = cellWidth
+        self.chars = (dead.ljust(cellWidth), alive.ljust(cellWidth))
+        self.footer = footer
+        self.out = out
+        self.previous = None
+
+    def fullFrame(self, grid):
+        w = self.width
+        chars = self.chars
+        frame = [HIDE_CURSOR, CLEAR, moveTo(0, 0)]
+        for y in range(self.height):
+            frame.append(''.join(chars[cell] for cell in grid[y * w:(y + 1) * w]))
+            frame.append('\n')
+        frame.append(self.footer)
+        return frame
+
+    def diffFrame(self, grid):
+        w = self.width
+        chars = self.chars
+        previous = self.previous
+        frame = []
+        for y in range(self.height):
+            start = y * w
+            row = grid[start:start + w]
+            if row == previous[start:start + w]:
+                continue  # Nothing changed on this row.
+            cursor = None  # Column the cursor is at after the last write.
+            for x, cell in enumerate(row):
+                if cell == previous[start + x]:
+                    continue
+                if cursor != x:
+                    frame.append(moveTo(y, x * self.cellWidth))
+                frame.append(chars[cell])
+                cursor = x + 1
+        return frame
+
+    def draw(self, grid):
+        """Show grid, a bytearray of cells in row-major order."""
+        if self.previous is None:
+            frame = self.fullFrame(grid)
+        else:
+            frame = self.diffFrame(grid)
+        # Park the cursor under the footer so typed keys don't scribble
+        # over the cells.
+        frame.append(moveTo(self.height + 1, 0))
+        self.out.write(''.join(frame))
+        self.out.flush()
+        self.previous = bytes(grid)
+
+    def close(self):
+        self.out.write(moveTo(self.height + 1, 0) + SHOW_CURSOR + '\n')
+        self.out.flush()
+
+
+class FrameLimiter:
+    """Sleep just long enough to keep frames at most fps per second.
+
+    Unlike a fixed sleep, the time spent stepping and drawing counts
+    towards the frame. fps of None or 0 means no limit.
+    """
+
+    def __init__(self, fps):
+        self.interval = 1 / fps if fps else 0
+        self.deadline = time.monotonic()
+
+    def wait(self):
+        self.deadline += self.interval
+        delay = self.deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # Running behind; start counting again from now instead of
+            # rushing frames out to catch up.
+            self.deadline = time.monotonic()
@@ -0,0 +1,54 @@
+import re
+
+CONWAY = 'B3/S23'
+
+RULE = re.compile(r'B([0-8]*)/S([0-8]*)', re.IGNORECASE)
+SB_RULE = re.compile(r'([0-8]*)/([0-8]*)')  # The older survival/birth notation.
+
+
+def parseRule(text):
+    """Return (birth, survival) neighbor counts from a rule like B36/S23.
+
+    Both B3/S23 and the older 23/3 notation (survival first) are accepted.
+    """
+    text = text.strip()
+    match = RULE.fullmatch(text)
+    if match is not None:
+        birth, survival = match.groups()
+    else:
+        match = SB_RULE.fullmatch(text)
+        if match is None:
+            raise ValueError(f'bad rule {text!r}, expected something like {CONWAY}')
+        survival, birth = match.groups()
+    return frozenset(map(int, birth)), frozenset(map(int, survival))
+
+
+def ruleTable(rule=CONWAY):
+    """Compile a rule string into a lookup table of next states.
+
+    table[numNeighbors * 2 + state] is 1 if a cell in state (1 for alive,
+    0 for dead) with numNeighbors living neighbors is alive next
+    generation, and 0 if it is dead.
+    """
+    birth, survival = parseRule(rule)
+    table = bytearray(18)
+    for numNeighbors in range(9):
+        table[numNeighbors * 2] = numNeighbors in birth
+        table[numNeighbors * 2 + 1] = numNeighbors in survival
+    return bytes(table)
+
+
+def ruleName(rule):
+    """Return rule in the canonical B.../S... form."""
+    birth, survival = parseRule(rule)
+    return 'B%s/S%s' % (''.join(map(str, sorted(birth))),
+                        ''.join(map(str, sorted(survival))))
+
+
+def bornFromNothing(table):
+    """Return True if dead cells with no living neighbors come alive (B0).
+
+    Engines that skip empty space can't run these rules, because empty
+    space doesn't stay empty under them.
+    """
+    return bool(table[0])
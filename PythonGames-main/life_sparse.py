@@ -0,0 +1,71 @@
+from life_rules import CONWAY, bornFromNothing, ruleTable
+
+OFFSETS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+
+
+class SparseEngine:
+    """Game of Life engine that stores only the living cells.
+
+    live is a set of (x, y) tuples. A cell can only change if it or one of
+    its neighbors changed in the last generation, so each step only looks
+    at the cells around the previous step's births and deaths, and a
+    generation costs time in proportion to the activity on the board
+    rather than its area.
+
+    With unbounded=True the cells live on an infinite plane and the width
+    and height only set the window that grid() returns; otherwise they wrap
+    around the edges like the other engines.
+    """
+
+    def __init__(self, width, height, grid, unbounded=False, rule=CONWAY):
+        self.width = width
+        self.height = height
+        self.table = ruleTable(rule)
+        if bornFromNothing(self.table):
+            raise ValueError('the sparse engine cannot run B0 rules')
+        self.unbounded = unbounded
+        self.live = {(i % width, i // width) for i, cell in enumerate(grid) if cell}
+        # Every living cell counts as changed so the first step looks at all
+        # of them and their neighbors.
+        self.changed = list(self.live)
+
+    def neighbors(self, x, y):
+        """Return the eight coordinates around (x, y)."""
+        if self.unbounded:
+            return [(x + dx, y + dy) for dx, dy in OFFSETS]
+        w, h = self.width, self.height
+        return [((x + dx) % w, (y + dy) % h) for dx, dy in OFFSETS]
+
+    def step(self, generations=1):
+        live = self.live
+        neighbors = self.neighbors
+        table = self.table
+        for i in range(generations):
+            # The cells that might change this generation:
+            candidates = set(self.changed)
+            for x, y in self.changed:
+                candidates.update(neighbors(x, y))
+
+            born = []
+            died = []
+            for cell in candidates:
+                numNeighbors = 0
+                for neighbor in neighbors(*cell):
+                    if neighbor in live:
+                        numNeighbors += 1
+                alive = cell in live
+                if table[numNeighbors * 2 + alive] != alive:
+                    if alive:
+                        died.append(cell)
+                    else:
+                        born.append(cell)
+            live.difference_update(died)
+            live.update(born)
+            self.changed = born + died
+
+    def grid(self):
+        grid = bytearray(self.width * self.height)
+        for x, y in self.live:
+            if 0 <= x < self.width and 0 <= y < self.height:
+                grid[y * self.width + x] = 1
+        return grid
@@ -1,8 +1,4 @@
-from PIL import Image, ImageFilter
+from pipeline import parse_steps, process_file
 
 # replace"bridge.bmp" with your image
-before = Image.open("qr.png")
-
-after = before.filter(ImageFilter.BLUR)
-
-after.save("Blurred.png")
\ No newline at end of file
+process_file("qr.png", "Blurred.png", parse_steps(["blur"]))
\ No newline at end of file
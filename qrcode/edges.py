@@ -1,8 +1,4 @@
-from PIL import Image, ImageFilter
+from pipeline import parse_steps, process_file
 
 # replace"bridge.bmp" with your image
-before = Image.open("qr.png")
-
-after = before.filter(ImageFilter.FIND_EDGES)
-
-after.save("Edged.png")
\ No newline at end of file
+process_file("qr.png", "Edged.png", parse_steps(["edges"]))
\ No newline at end of file
@@ -0,0 +1,101 @@
+import argparse
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+import filters_numpy
+
+SIZES = (37, 370, 1480)  # A version 5 QR code at 1 and 10 pixels per module, and a print scan.
+BATCHES = (1, 16, 128)
+
+
+def make_images(size, count, mode, seed=0):
+    """Return count random QR-like size x size images: square black and white blocks."""
+    rng = np.random.default_rng(seed)
+    modules = max(size // 10, 1)
+    images = []
+    for _ in range(count):
+        blocks = rng.integers(0, 2, (modules, modules), dtype=np.uint8) * 255
+        image = Image.fromarray(blocks).resize((size, size), Image.NEAREST)
+        images.append(image.convert(mode))
+    return images
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(sizes=SIZES, batches=BATCHES, names=('blur', 'edges'), mode='L', repeat=5):
+    """Time Pillow and NumPy on the same images for every size and batch.
+
+    The NumPy time includes turning the images into arrays and back,
+    since the pipeline pays for that too. Every result is checked
+    against Pillow's first. Return a list of result dicts.
+    """
+    results = []
+    for size in sizes:
+        for batch in batches:
+            images = make_images(size, batch, mode)
+
+            def pillow():
+                out = images
+                for name in names:
+                    out = [image.filter(filters_numpy.PILLOW[name]) for image in out]
+                return out
+
+            def numpy():
+                return filters_numpy.apply_batch(images, names)
+
+            identical = all(a.tobytes() == b.tobytes() for a, b in zip(pillow(), numpy()))
+            pillow_seconds = best_time(pillow, repeat)
+            numpy_seconds = best_time(numpy, repeat)
+            results.append({
+                'size': size,
+                'batch': batch,
+                'mode': mode,
+                'filters': list(names),
+                'pillow_us_per_image': round(pillow_seconds / batch * 1e6, 1),
+                'numpy_us_per_image': round(numpy_seconds / batch * 1e6, 1),
+                'speedup': round(pillow_seconds / numpy_seconds, 2),
+                'identical': identical,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the Pillow and NumPy filter backends')
+    parser.add_argument('filters', nargs='*',
+                        help='filters to chain, from %s (default: blur edges)' % ', '.join(filters_numpy.KERNELS))
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=SIZES, help='image widths and heights')
+    parser.add_argument('-b', '--batches', type=int, nargs='+', default=BATCHES, help='images per batch')
+    parser.add_argument('-m', '--mode', choices=filters_numpy.MODES, default='L')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='runs to take the best of')
+    parser.add_argument('--json', help='write the results as JSON to this file, or - for stdout')
+    args = parser.parse_args()
+    for name in args.filters:
+        if name not in filters_numpy.KERNELS:
+            parser.error(f'unknown filter {name!r}')
+
+    results = benchmark(args.sizes, args.batches, args.filters or ('blur', 'edges'), args.mode, args.repeat)
+    if args.json == '-':
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{"size":>6} {"batch":>6} {"pillow us/img":>14} {"numpy us/img":>13} {"speedup":>8}  identical')
+    for result in results:
+        print(f'{result["size"]:>6} {result["batch"]:>6} {result["pillow_us_per_image"]:>14} '
+              f'{result["numpy_us_per_image"]:>13} {result["speedup"]:>7}x  {result["identical"]}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
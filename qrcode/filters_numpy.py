@@ -0,0 +1,133 @@
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Modes whose pixels are one byte per band, which the kernels below
+# handle. Anything else is left to Pillow.
+MODES = ('1', 'L', 'RGB', 'RGBA')
+
+
+def box_sum(pixels, n):
+    """Sum every n x n window of an (images, height, width, bands) array.
+
+    The windows that fit inside the image are summed separably, a row
+    pass then a column pass, which is 2n additions per pixel instead of
+    n * n. Element [i, y, x] is the window whose top left is (x, y).
+    """
+    width = pixels.shape[2] - n + 1
+    rows = pixels[:, :, :width].copy()
+    for i in range(1, n):
+        rows += pixels[:, :, i:i + width]
+    height = rows.shape[1] - n + 1
+    sums = rows[:, :height].copy()
+    for i in range(1, n):
+        sums += rows[:, i:i + height]
+    return sums
+
+
+# Pillow copies the pixels within a kernel's radius of the border
+# unchanged and rounds (sum + divisor / 2) / divisor, clipped to 0-255.
+# Its kernels are all integers, so plain integer arithmetic gives the
+# same bytes.
+
+def blur(pixels):
+    """ImageFilter.BLUR: the mean of the 5x5 ring around each pixel."""
+    out = pixels.copy()
+    if min(pixels.shape[1:3]) < 5:
+        return out
+    wide = pixels.astype(np.int16)
+    ring = box_sum(wide, 5)
+    ring -= box_sum(wide, 3)[:, 1:-1, 1:-1]  # The ring is a 5x5 box less its 3x3 middle.
+    ring += 8
+    ring >>= 4
+    out[:, 2:-2, 2:-2] = ring
+    return out
+
+
+def find_edges(pixels):
+    """ImageFilter.FIND_EDGES: 8 times each pixel less its 8 neighbors."""
+    out = pixels.copy()
+    if min(pixels.shape[1:3]) < 3:
+        return out
+    wide = pixels.astype(np.int16)
+    edges = wide[:, 1:-1, 1:-1] * 9
+    edges -= box_sum(wide, 3)
+    np.clip(edges, 0, 255, out=edges)
+    out[:, 1:-1, 1:-1] = edges
+    return out
+
+
+def sharpen(pixels):
+    """ImageFilter.SHARPEN: 32 times each pixel less 2 per neighbor, over 16."""
+    out = pixels.copy()
+    if min(pixels.shape[1:3]) < 3:
+        return out
+    wide = pixels.astype(np.int16)
+    sharp = wide[:, 1:-1, 1:-1] * 34
+    sharp -= box_sum(wide, 3) * 2
+    sharp += 8
+    sharp >>= 4
+    np.clip(sharp, 0, 255, out=sharp)
+    out[:, 1:-1, 1:-1] = sharp
+    return out
+
+
+KERNELS = {
+    'blur': blur,
+    'edges': find_edges,
+    'find-edges': find_edges,
+    'sharpen': sharpen,
+}
+
+# The same filters in Pillow, for images in modes the kernels don't take.
+PILLOW = {
+    'blur': ImageFilter.BLUR,
+    'edges': ImageFilter.FIND_EDGES,
+    'find-edges': ImageFilter.FIND_EDGES,
+    'sharpen': ImageFilter.SHARPEN,
+}
+
+
+def to_array(image):
+    """Return image's pixels as a (height, width, bands) uint8 array."""
+    if image.mode == '1':
+        image = image.convert('L')
+    pixels = np.asarray(image)
+    return pixels.reshape(image.height, image.width, -1)
+
+
+def to_image(pixels, mode):
+    if mode == '1':
+        # Pillow filters '1' images as bytes and counts any nonzero
+        # result as white; so does this. Pillow also keeps the bytes
+        # between filters, which a chain here only does while it stays
+        # in apply_batch(): a '1' image blurred, resized and blurred
+        # again can come out differently.
+        return Image.fromarray(pixels[:, :, 0] != 0)
+    if pixels.shape[2] == 1:
+        return Image.fromarray(pixels[:, :, 0])
+    return Image.fromarray(pixels)
+
+
+def apply_batch(images, names):
+    """Run every image through the kernel filters names, in order.
+
+    Images of the same mode and size are stacked into one array so each
+    filter is a single NumPy operation over the whole batch, and they
+    stay arrays from one filter to the next. Return the filtered images
+    in the order given.
+    """
+    results = list(images)
+    groups = {}
+    for i, image in enumerate(images):
+        if image.mode in MODES:
+            groups.setdefault((image.mode, image.size), []).append(i)
+        else:
+            for name in names:
+                results[i] = results[i].filter(PILLOW[name])
+    for (mode, _), indexes in groups.items():
+        pixels = np.stack([to_array(images[i]) for i in indexes])
+        for name in names:
+            pixels = KERNELS[name](pixels)
+        for i, filtered in zip(indexes, pixels):
+            results[i] = to_image(filtered, mode)
+    return results
\ No newline at end of file
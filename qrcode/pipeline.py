@@ -0,0 +1,237 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from PIL import Image, ImageFilter
+
+# pillow filters one image at a time; numpy runs the kernel filters over
+# whole batches of same-sized images at once (see filters_numpy.py).
+BACKENDS = ('pillow', 'numpy')
+
+IMAGE_EXTENSIONS = ('.png', '.bmp', '.gif', '.jpg', '.jpeg', '.tif', '.tiff', '.webp',
+                    '.pbm', '.pgm', '.ppm', '.pnm')
+
+
+def blur(image):
+    return image.filter(ImageFilter.BLUR)
+
+
+def find_edges(image):
+    return image.filter(ImageFilter.FIND_EDGES)
+
+
+def sharpen(image):
+    return image.filter(ImageFilter.SHARPEN)
+
+
+def grayscale(image):
+    return image.convert('L')
+
+
+def threshold(image, level='128'):
+    """Turn every pixel black or white, white from level (0-255) up."""
+    level = int(level)
+    return image.convert('L').point(lambda p: 255 if p >= level else 0)
+
+
+def resize(image, size):
+    """Resize to WIDTHxHEIGHT pixels, or by a factor such as 0.5."""
+    if 'x' in size:
+        width, height = map(int, size.split('x'))
+    else:
+        width, height = (round(n * float(size)) for n in image.size)
+    return image.resize((width, height), Image.NEAREST if image.mode == '1' else Image.LANCZOS)
+
+
+FILTERS = {
+    'blur': blur,
+    'edges': find_edges,
+    'find-edges': find_edges,
+    'sharpen': sharpen,
+    'grayscale': grayscale,
+    'threshold': threshold,
+    'resize': resize,
+}
+
+# How many pixels out each local filter looks; see tiles.overlap().
+RADIUS = {
+    'blur': ImageFilter.BLUR.filterargs[0][0] // 2,
+    'edges': ImageFilter.FIND_EDGES.filterargs[0][0] // 2,
+    'find-edges': ImageFilter.FIND_EDGES.filterargs[0][0] // 2,
+    'sharpen': ImageFilter.SHARPEN.filterargs[0][0] // 2,
+    'grayscale': 0,
+    'threshold': 0,
+}
+
+
+def parse_steps(specs):
+    """Turn filter specs like "blur" or "resize:200x200" into (name, args) steps."""
+    steps = []
+    for spec in specs:
+        name, _, arg = spec.partition(':')
+        if name not in FILTERS:
+            raise ValueError(f'unknown filter {name!r}; choose from {", ".join(FILTERS)}')
+        steps.append((name, (arg,) if arg else ()))
+    return steps
+
+
+def apply(image, steps, backend='pillow'):
+    """Run image through every step in order, all in memory."""
+    if backend != 'pillow':
+        return apply_batch([image], steps, backend)[0]
+    for name, args in steps:
+        image = FILTERS[name](image, *args)
+    return image
+
+
+def apply_batch(images, steps, backend='pillow'):
+    """Run every image through every step in order.
+
+    With the numpy backend each run of kernel filters in steps is done
+    by filters_numpy for the whole batch at once, and the other steps
+    one image at a time with Pillow.
+    """
+    if backend == 'pillow':
+        return [apply(image, steps) for image in images]
+    import filters_numpy
+    i = 0
+    while i < len(steps):
+        names = []
+        while i < len(steps) and steps[i][0] in filters_numpy.KERNELS:
+            names.append(steps[i][0])
+            i += 1
+        if names:
+            images = filters_numpy.apply_batch(images, names)
+        else:
+            name, args = steps[i]
+            images = [FILTERS[name](image, *args) for image in images]
+            i += 1
+    return list(images)
+
+
+def process_file(source, destination, steps, format=None, tile_size=None, tile_workers=None,
+                 backend='pillow'):
+    """Decode source once, filter it and write only the result.
+
+    With tile_size, filter it in tiles instead; see tiles.filter_file().
+    """
+    if tile_size:
+        import tiles
+        tiles.filter_file(source, destination, steps, format, tile_size, tile_workers, backend)
+        return
+    with Image.open(source) as image:
+        image.load()
+        result = apply(image, steps, backend)
+    result.save(destination, format)
+
+
+def process_chunk(files, steps, format=None, tile_size=None, tile_workers=None, backend='pillow'):
+    """Filter a chunk of (source, destination) files in a worker process.
+
+    The chunk is decoded first and filtered as one batch, which is what
+    lets the numpy backend vectorize across images. Return the errors.
+    """
+    errors = []
+    if tile_size:
+        for source, destination in files:
+            try:
+                process_file(source, destination, steps, format, tile_size, tile_workers, backend)
+            except Exception as e:
+                errors.append(f'{source}: {e}')
+        return errors
+
+    images = []
+    destinations = []
+    for source, destination in files:
+        try:
+            with Image.open(source) as image:
+                image.load()
+            images.append(image)
+            destinations.append(destination)
+        except Exception as e:
+            errors.append(f'{source}: {e}')
+    try:
+        results = apply_batch(images, steps, backend)
+    except Exception as e:
+        return errors + [f'{destination}: {e}' for destination in destinations]
+    for result, destination in zip(results, destinations):
+        try:
+            result.save(destination, format)
+        except Exception as e:
+            errors.append(f'{destination}: {e}')
+    return errors
+
+
+def process_directory(source, output, steps, format=None, workers=None, chunk_size=32,
+                      tile_size=None, tile_workers=None, backend='pillow'):
+    """Filter every image in the source directory into output in parallel.
+
+    Each worker process decodes, filters and saves its own chunk of
+    images, so only file names go between processes. Return (images
+    written, errors, seconds).
+    """
+    os.makedirs(output, exist_ok=True)
+    names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+    files = []
+    for name in names:
+        if format:
+            name_out = os.path.splitext(name)[0] + '.' + format.lower()
+        else:
+            name_out = name
+        files.append((os.path.join(source, name), os.path.join(output, name_out)))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    job = partial(process_chunk, steps=steps, format=format, tile_size=tile_size,
+                  tile_workers=tile_workers, backend=backend)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        errors = [error for chunk_errors in executor.map(job, chunks) for error in chunk_errors]
+    return len(files) - len(errors), errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run images through a chain of filters',
+        epilog='Filters: %s. Give arguments after a colon, e.g. threshold:100, resize:0.5 or '
+               'resize:200x200. Example: pipeline.py -i qr.png -o out.png blur edges' % ', '.join(FILTERS))
+    parser.add_argument('filters', nargs='+', help='filters to apply, in order')
+    parser.add_argument('-i', '--input', default='qr.png', help='image, or directory of images')
+    parser.add_argument('-o', '--output', required=True, help='output image, or directory for a directory input')
+    parser.add_argument('--format', help='output format, e.g. PNG (default: from the output name)')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes for a directory (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=32,
+                        help='images a worker decodes and filters as one batch')
+    parser.add_argument('-b', '--backend', choices=BACKENDS, default='pillow',
+                        help='run blur, edges and sharpen with Pillow, or with NumPy over whole batches')
+    parser.add_argument('-t', '--tile-size', type=int,
+                        help='filter in tiles of this many pixels square, to bound memory on huge images; '
+                             'PBM/PGM/PPM files are then also read and written a band at a time')
+    parser.add_argument('--tile-workers', type=int, help='threads filtering tiles (default: one per CPU, plus 4)')
+    args = parser.parse_args()
+    try:
+        steps = parse_steps(args.filters)
+        if args.tile_size:
+            import tiles
+            tiles.overlap(steps)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not os.path.isdir(args.input):
+        process_file(args.input, args.output, steps, args.format, args.tile_size, args.tile_workers,
+                     args.backend)
+        return
+
+    done, errors, seconds = process_directory(args.input, args.output, steps, args.format, args.workers,
+                                              args.chunk_size, args.tile_size, args.tile_workers,
+                                              args.backend)
+    for error in errors:
+        print(f'[!] {error}', file=sys.stderr)
+    rate = done / seconds if seconds else 0
+    print(f'[*] {done} images in {seconds:.2f}s ({rate:.0f} images/s), {len(errors)} failed')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -1,4 +1,216 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import qrcode
+from qrcode.constants import ERROR_CORRECT_H, ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q
+
+from qr_cache import QRCache
+
+ERROR_CORRECTION = {'L': ERROR_CORRECT_L, 'M': ERROR_CORRECT_M, 'Q': ERROR_CORRECT_Q, 'H': ERROR_CORRECT_H}
+
+# Everything about a code except its data. version None fits the data.
+Settings = namedtuple('Settings', 'version error_correction box_size border format')
+DEFAULT_SETTINGS = Settings(None, 'M', 10, 4, 'PNG')
+
+
+def encode(data, settings=DEFAULT_SETTINGS):
+    """Return the image of a QR code for data, encoded as settings.format."""
+    qr = qrcode.QRCode(version=settings.version,
+                       error_correction=ERROR_CORRECTION[settings.error_correction],
+                       box_size=settings.box_size, border=settings.border)
+    qr.add_data(data)
+    qr.make(fit=settings.version is None)
+    out = io.BytesIO()
+    qr.make_image().save(out, settings.format)
+    return out.getvalue()
+
+
+def read_payloads(path):
+    """Yield (name, data) for every payload in a CSV or JSONL file.
+
+    CSV files need a data column and may have a name column; without a
+    header row the first column is the data. JSONL lines are either
+    objects with the same keys or plain strings. name is None when the
+    file doesn't give one.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, str):
+                    yield None, item
+                else:
+                    yield item.get('name'), item['data']
+            return
+
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            return
+        if 'data' in header:
+            data_column = header.index('data')
+            name_column = header.index('name') if 'name' in header else None
+        else:
+            data_column, name_column = 0, None
+            yield None, header[0]  # No header; the first row is data.
+        for row in rows:
+            if row:
+                yield (row[name_column] if name_column is not None else None), row[data_column]
+
+
+def cached_encode(data, settings, cache):
+    """encode(), but reuse the image from cache if it has one."""
+    if cache is None:
+        return encode(data, settings)
+    image = cache.get(data, settings)
+    if image is None:
+        image = encode(data, settings)
+        cache.put(data, settings, image)
+    return image
+
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_chunk(jobs, output, settings, cache_dir=None):
+    """Render and save a chunk of (path, data) jobs in a worker process.
+
+    The images are written here rather than sent back, so only counts
+    and any errors cross back to the parent. Return (done, errors, cache
+    hits, cache misses, bytes added to the cache).
+    """
+    cache = QRCache(cache_dir) if cache_dir else None
+    done = 0
+    errors = []
+    for path, data in jobs:
+        try:
+            image = cached_encode(data, settings, cache)
+            with open(os.path.join(output, path), 'wb') as f:
+                f.write(image)
+            done += 1
+        except Exception as e:
+            errors.append(f'{path}: {e}')
+    if cache is None:
+        return done, errors, 0, 0, 0
+    return done, errors, cache.hits, cache.misses, cache.stored
+
+
+def generate(path, output, settings=DEFAULT_SETTINGS, workers=None, chunk_size=256, max_in_flight=None,
+             cache=None):
+    """Render every payload in the file at path into the output directory.
+
+    Payloads are read lazily and sent to the workers chunk_size at a time,
+    with at most max_in_flight chunks submitted but not finished, so
+    memory stays flat however many codes the file asks for. With a
+    QRCache the workers reuse its images, and it is trimmed whenever a
+    tenth of its size has been added. Return (codes written, errors,
+    seconds); the cache's hits, misses and evicted counts are updated.
+    """
+    os.makedirs(output, exist_ok=True)
+    extension = '.' + settings.format.lower()
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * workers
+    cache_dir = cache.root if cache is not None else None
+
+    def jobs():
+        for index, (name, data) in enumerate(read_payloads(path)):
+            # Keep names inside the output directory.
+            name = os.path.basename(name) if name else f'{index:08d}'
+            yield name + extension, data
+
+    done = 0
+    errors = []
+    added = 0  # Bytes put in the cache since it was last trimmed.
+
+    def collect(future):
+        nonlocal done, added
+        count, failed, hits, misses, stored = future.result()
+        done += count
+        errors.extend(failed)
+        if cache is not None:
+            cache.hits += hits
+            cache.misses += misses
+            cache.stored += stored
+            added += stored
+            if added > cache.max_bytes // 10:
+                cache.trim()
+                added = 0
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for chunk in chunks(jobs(), chunk_size):
+            if len(in_flight) >= max_in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future)
+            in_flight.add(executor.submit(render_chunk, chunk, output, settings, cache_dir))
+        for future in in_flight:
+            collect(future)
+    if cache is not None:
+        cache.trim()
+    return done, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Make QR codes',
+        epilog='Without --input, writes one code for --data to qr.png.')
+    parser.add_argument('-d', '--data', default='https://www.digital---wall.com/', help='what to encode')
+    parser.add_argument('-i', '--input', help='CSV or JSONL file of payloads to render in a batch')
+    parser.add_argument('-o', '--output', default='qr_codes', help='directory for batch output')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=256, help='payloads sent to a worker at a time')
+    parser.add_argument('--max-in-flight', type=int, help='chunks submitted but not finished (default: 2 per worker)')
+    parser.add_argument('--version', type=int, choices=range(1, 41), metavar='1-40',
+                        help='QR version (size); default: the smallest that fits')
+    parser.add_argument('--error-correction', choices='LMQH', default='M')
+    parser.add_argument('--box-size', type=int, default=10, help='pixels per module')
+    parser.add_argument('--border', type=int, default=4, help='quiet zone in modules')
+    parser.add_argument('--format', default='PNG', help='image format, e.g. PNG, GIF or BMP')
+    parser.add_argument('--cache', help='directory of previously made images to reuse')
+    parser.add_argument('--cache-size', type=int, default=512, help='most megabytes to keep in --cache')
+    args = parser.parse_args()
+    settings = Settings(args.version, args.error_correction, args.box_size, args.border, args.format.upper())
+    cache = QRCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+
+    if not args.input:
+        with open('qr.' + settings.format.lower(), 'wb') as f:
+            f.write(cached_encode(args.data, settings, cache))
+        if cache is not None:
+            cache.trim()
+        return
+
+    done, errors, seconds = generate(args.input, args.output, settings, args.workers,
+                                     args.chunk_size, args.max_in_flight, cache)
+    for error in errors:
+        print(f'[!] {error}', file=sys.stderr)
+    rate = done / seconds if seconds else 0
+    print(f'[*] {done} codes in {seconds:.2f}s ({rate:.0f} codes/s), {len(errors)} failed')
+    if cache is not None:
+        lookups = cache.hits + cache.misses
+        files, size = cache.usage()
+        print(f'[*] cache: {cache.hits} hits, {cache.misses} misses '
+              f'({100 * cache.hits / lookups if lookups else 0:.1f}% hit rate), '
+              f'{cache.evicted} evicted, {files} images in {size / 1048576:.1f} MB')
+
 
-img = qrcode.make("https://www.digital---wall.com/")
-img.save("qr.png", "PNG")
+if __name__ == '__main__':
+    main()
\ No newline at end of file
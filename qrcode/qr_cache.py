@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+
+
+class QRCache:
+    """On-disk cache of encoded QR images, keyed by what went into them.
+
+    The key is a SHA-256 of the data and every setting that changes the
+    image, and the image lives at root/ab/abcdef... under it. Entries are
+    written to a temporary file and renamed into place, so processes
+    sharing a cache never see half a file. A hit bumps the file's mtime,
+    and trim() deletes the least recently used files once the cache is
+    over max_bytes.
+    """
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0  # Bytes added by put().
+        self.evicted = 0  # Files deleted by trim().
+
+    def path(self, data, settings):
+        key = json.dumps([data, *settings]).encode()
+        digest = hashlib.sha256(key).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, data, settings):
+        """Return the cached image for data and settings, or None."""
+        path = self.path(data, settings)
+        try:
+            with open(path, 'rb') as f:
+                image = f.read()
+            os.utime(path)  # Most recently used now.
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return image
+
+    def put(self, data, settings, image):
+        path = self.path(data, settings)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(image)
+        os.replace(temp, path)
+        self.stored += len(image)
+
+    def entries(self):
+        """Yield (mtime, size, path) for every cached image."""
+        for directory in os.scandir(self.root):
+            if not directory.is_dir():
+                continue
+            for entry in os.scandir(directory.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # Evicted by another process meanwhile.
+                yield stat.st_mtime, stat.st_size, entry.path
+
+    def usage(self):
+        """Return (files, bytes) in the cache."""
+        files = size = 0
+        for _, nbytes, _ in self.entries():
+            files += 1
+            size += nbytes
+        return files, size
+
+    def trim(self):
+        """Delete the least recently used images until the cache fits.
+
+        It trims to 90% of max_bytes, so a run of puts doesn't rescan the
+        cache after every one. Return the bytes in the cache afterwards.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+        target = self.max_bytes * 9 // 10
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.evicted += 1
+        return total
\ No newline at end of file
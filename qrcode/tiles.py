@@ -0,0 +1,181 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from pipeline import RADIUS, apply
+
+# Netpbm files are a short text header followed by the raw rows, so a
+# band of rows can be read or written with one seek and no decoding.
+PNM_MODES = {b'P4': '1', b'P5': 'L', b'P6': 'RGB'}
+PNM_MAGIC = {mode: magic for magic, mode in PNM_MODES.items()}
+PNM_EXTENSIONS = ('.pbm', '.pgm', '.ppm', '.pnm')
+PNM_FIELD = re.compile(rb'(?:\s|#[^\n]*\n)*(\d+)')
+
+
+def rawmode(mode):
+    # In PBM a 1 bit is black; in Pillow it is white.
+    return '1;I' if mode == '1' else mode
+
+
+def overlap(steps):
+    """Return how far a tile must reach past its edges for steps.
+
+    Each kernel filter looks radius pixels out, and in a chain the reach
+    adds up. Steps that aren't local, like resize, can't be tiled.
+    """
+    total = 0
+    for name, _ in steps:
+        if name not in RADIUS:
+            raise ValueError(f'{name} does not work on tiles')
+        total += RADIUS[name]
+    return total
+
+
+def row_bytes(mode, width):
+    return (width + 7) // 8 if mode == '1' else width * len(mode)
+
+
+class ImageSource:
+    """Bands of rows from an image decoded into memory."""
+
+    def __init__(self, image):
+        image.load()
+        self.image = image
+        self.mode = image.mode
+        self.size = image.size
+
+    def rows(self, top, bottom):
+        return self.image.crop((0, top, self.size[0], bottom))
+
+    def close(self):
+        self.image.close()
+
+
+class PnmSource:
+    """Bands of rows read straight from a binary PBM, PGM or PPM file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        head = self.file.read(1024)
+        magic = head[:2]
+        if magic not in PNM_MODES:
+            raise ValueError(f'{path} is not a binary PBM, PGM or PPM file')
+        fields = []
+        end = 2
+        while len(fields) < (2 if magic == b'P4' else 3):
+            match = PNM_FIELD.match(head, end)
+            if match is None:
+                raise ValueError(f'{path} has a bad header')
+            fields.append(int(match.group(1)))
+            end = match.end()
+        if magic != b'P4' and fields[2] != 255:
+            raise ValueError(f'{path} is not 8 bits per sample')
+        self.mode = PNM_MODES[magic]
+        self.size = fields[0], fields[1]
+        self.offset = end + 1  # One whitespace byte ends the header.
+        self.stride = row_bytes(self.mode, self.size[0])
+
+    def rows(self, top, bottom):
+        self.file.seek(self.offset + top * self.stride)
+        data = self.file.read((bottom - top) * self.stride)
+        return Image.frombytes(self.mode, (self.size[0], bottom - top), data, 'raw', rawmode(self.mode))
+
+    def close(self):
+        self.file.close()
+
+
+class ImageSink:
+    """Collect bands into one image to save at the end."""
+
+    def __init__(self, path, format=None):
+        self.path = path
+        self.format = format
+        self.image = None
+
+    def write(self, band, top, size):
+        if self.image is None:
+            self.image = Image.new(band.mode, size)
+        self.image.paste(band, (0, top))
+
+    def close(self):
+        self.image.save(self.path, self.format)
+
+
+class PnmSink:
+    """Write bands to a binary PBM, PGM or PPM file as they are finished."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def write(self, band, top, size):
+        if self.file is None:
+            if band.mode not in PNM_MAGIC:
+                raise ValueError(f'{band.mode} images cannot be saved as PBM, PGM or PPM')
+            self.file = open(self.path, 'wb')
+            header = b'%s\n%d %d\n' % (PNM_MAGIC[band.mode], *size)
+            if band.mode != '1':
+                header += b'255\n'
+            self.file.write(header)
+        self.file.write(band.tobytes('raw', rawmode(band.mode)))
+
+    def close(self):
+        self.file.close()
+
+
+def filter_tiled(source, sink, steps, tile_size=1024, workers=None, backend='pillow'):
+    """Filter source into sink one band of tiles at a time.
+
+    Every tile is cut with overlap() extra pixels around it, filtered on
+    its own on a thread pool, and trimmed back, so the pixels near its
+    edges see the same neighbors as they would in the whole image and
+    the result is identical to filtering it in one piece. Only one band
+    of tile_size rows (plus the overlap) is in memory at a time, unless
+    the source or sink has to hold the whole image anyway.
+    """
+    margin = overlap(steps)
+    width, height = source.size
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for top in range(0, height, tile_size):
+            bottom = min(top + tile_size, height)
+            band_top = max(top - margin, 0)
+            band = source.rows(band_top, min(bottom + margin, height))
+
+            def tile(left):
+                right = min(left + tile_size, width)
+                tile_left = max(left - margin, 0)
+                piece = band.crop((tile_left, 0, min(right + margin, width), band.height))
+                piece = apply(piece, steps, backend)
+                # Keep only the pixels that saw all their neighbors.
+                return left, piece.crop((left - tile_left, top - band_top,
+                                         right - tile_left, bottom - band_top))
+
+            pieces = list(executor.map(tile, range(0, width, tile_size)))
+            out = Image.new(pieces[0][1].mode, (width, bottom - top))
+            for left, piece in pieces:
+                out.paste(piece, (left, 0))
+            sink.write(out, top, (width, height))
+    sink.close()
+
+
+def filter_file(source_path, destination, steps, format=None, tile_size=1024, workers=None,
+                backend='pillow'):
+    """Filter an image file tile by tile.
+
+    Binary PBM, PGM and PPM files are read and written a band at a time,
+    so both ends stay within a band of memory however big the image is.
+    Other formats are decoded or encoded whole.
+    """
+    if source_path.lower().endswith(PNM_EXTENSIONS):
+        source = PnmSource(source_path)
+    else:
+        source = ImageSource(Image.open(source_path))
+    if format is None and destination.lower().endswith(PNM_EXTENSIONS):
+        sink = PnmSink(destination)
+    else:
+        sink = ImageSink(destination, format)
+    try:
+        filter_tiled(source, sink, steps, tile_size, workers, backend)
+    finally:
+        source.close()
\ No newline at end of file